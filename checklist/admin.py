@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Checklist
+from .models import Checklist, Job
 
 admin.site.register(Checklist)
+# failed background jobs are kept with their error for inspection
+admin.site.register(Job)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ChecklistConfig(AppConfig):
     name = "checklist"
+
+    def ready(self):
+        # keeps the full-text search index in sync
+        import checklist.signals  # noqa: F401
@@ -0,0 +1,82 @@
+# pub/sub between whatever learns of a new notification and the push connections of its receiver, see checklist/stream.py
+# the broker is chosen with the NOTIFICATION_BROKER setting, e.g. one backed by Redis pub/sub to reach clients connected to other processes
+import asyncio
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = "checklist.broker.InProcessBroker"
+# messages waiting for a slow client, the oldest are dropped beyond it
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Broker:
+    # the interface used by the stream: a subscription collects the messages of one user, "await subscription.get()" returns the next one
+    # a shared broker reaches the subscribers of every process, so whoever writes a notification publishes it once committed;
+    # a broker which is not gets new notifications from the relay polling the database in each process
+    shared = False
+
+    def subscribe(self, user_id):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, user_id, message):
+        raise NotImplementedError
+
+    def subscribed_user_ids(self):
+        # users with at least one connection, publishers skip building messages for anyone else
+        raise NotImplementedError
+
+
+class Subscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker(Broker):
+    # reaches the connections served by this process only; used from its event loop, it needs no locking
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions.get(subscription.user_id, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self.subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, message):
+        for subscription in self.subscriptions.get(user_id, ()):
+            subscription.put(message)
+
+    def subscribed_user_ids(self):
+        return set(self.subscriptions)
+
+
+_broker = None
+
+
+def get_broker():
+    # one broker per process
+    global _broker
+    if _broker is None:
+        _broker = import_string(
+            getattr(settings, "NOTIFICATION_BROKER", DEFAULT_BROKER)
+        )()
+    return _broker
@@ -0,0 +1,138 @@
+# process-local caches invalidated through version stamps kept in django's cache framework - refer https://docs.djangoproject.com/en/3.0/topics/cache/
+# entries are keyed on the version they were computed for, so bumping the version drops them in every process sharing the cache backend,
+# which is why settings.CACHES must point at a backend shared between processes (memcached or the database) rather than LocMemCache;
+# a process re-reads a stamp at most every VERSION_CHECK_SECONDS, so with the database backend most renders cost no cache query
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+VERSION_KEY = "checklist:version:{}"
+# a bump is seen at once by the process making it and within this many seconds by every other process
+VERSION_CHECK_SECONDS = 5
+
+# stamps read by this process, name -> (version, time.monotonic() when read)
+checked_versions = {}
+checked_versions_lock = threading.Lock()
+
+
+def remember_version(name, version):
+    with checked_versions_lock:
+        checked_versions[name] = (version, time.monotonic())
+
+
+def get_version(name):
+    with checked_versions_lock:
+        checked = checked_versions.get(name)
+    if checked is not None and time.monotonic() - checked[1] < VERSION_CHECK_SECONDS:
+        return checked[0]
+
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        # a fresh stamp rather than a counter restarting at 1, which could revive entries cached before the key was lost
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    remember_version(name, version)
+    return version
+
+
+def bump_version(name):
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY.format(name), version, timeout=None)
+    remember_version(name, version)
+
+
+def forget_versions():
+    # read every stamp from the cache backend again on next use
+    with checked_versions_lock:
+        checked_versions.clear()
+
+
+@receiver(setting_changed)
+def forget_versions_of_old_backend(setting, **kwargs):
+    # another backend holds other stamps, e.g. under override_settings(CACHES=...) in tests
+    if setting == "CACHES":
+        forget_versions()
+
+
+class LRUCache:
+    # bounded mapping dropping the least recently used entry when full; entries older than ttl seconds count as misses
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None:
+                if time.monotonic() - entry[1] > self.ttl:
+                    del self.entries[key]
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class VersionedValue:
+    # a single value loaded once per process, loaded again after bump_version(name) from any process
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.lock = threading.Lock()
+        self.version = None
+        self.value = None
+
+    def get(self):
+        version = get_version(self.name)
+        with self.lock:
+            if self.version == version:
+                return self.value
+
+        # a bump while loading tags the new value with the old version, so it is loaded once more on the next get
+        value = self.load()
+        with self.lock:
+            self.value = value
+            self.version = version
+        return value
@@ -1,19 +1,66 @@
 # https://stackoverflow.com/a/34903331/6543250 - to pass data to "base.html"
+from django.utils.functional import SimpleLazyObject, cached_property
 
+from checklist.cache import VersionedValue, bump_version
 from checklist.models import Category, Notification
+from checklist.notifications import load_actors
+
+CATEGORY_VERSION = "categories"
+# categories rarely change, every process keeps the list until a Category is saved or deleted, see checklist/signals.py
+category_list = VersionedValue(
+    CATEGORY_VERSION, lambda: list(Category.objects.order_by("id"))
+)
+
+# notifications shown in the navbar dropdown, older ones are only counted
+NOTIF_DROPDOWN_LIMIT = 10
+
+
+class NotificationDropdown:
+    # queried on first use by a template, so pages which do not render the dropdown (and anonymous users) cost no query
+    def __init__(self, user):
+        self.user = user
+
+    def get_queryset(self):
+        if not self.user.is_authenticated:
+            return Notification.objects.none()
+        return Notification.objects.filter(toUser=self.user)
+
+    @cached_property
+    def latest(self):
+        # the dropdown shows sender and checklist of every notification, joined in instead of two queries per row
+        return load_actors(
+            list(
+                self.get_queryset()
+                .select_related("fromUser", "checklist")
+                .order_by("-date_notified", "-id")[:NOTIF_DROPDOWN_LIMIT]
+            )
+        )
+
+    @property
+    def latest_id(self):
+        # where the poll for newer notifications starts
+        return max((notif.id for notif in self.latest), default=0)
+
+    @cached_property
+    def unread_count(self):
+        # dismissed notifications are deleted, so every remaining one is unread; no COUNT needed when all of them fit
+        if len(self.latest) < NOTIF_DROPDOWN_LIMIT:
+            return len(self.latest)
+        return self.get_queryset().count()
+
+    @property
+    def hidden_count(self):
+        return self.unread_count - len(self.latest)
+
+
+def invalidate_category_list():
+    bump_version(CATEGORY_VERSION)
 
 
 def add_variable_to_context(request):
     context = {}
-    context["category_list"] = Category.objects.all()
-
-    # if user logged in
-    if request.user.is_authenticated:
-        # descending order in notifs whose receiving user is the currently logged in user
-        context["notif_list"] = Notification.objects.filter(
-            toUser=request.user
-        ).order_by("-date_notified")
-    else:
-        context["notif_list"] = []
+    # redirects and pages without the category sidebar do not even look up the version
+    context["category_list"] = SimpleLazyObject(category_list.get)
+    context["notifications"] = NotificationDropdown(request.user)
 
     return context
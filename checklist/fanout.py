@@ -0,0 +1,57 @@
+# fan-out on publish - a published checklist is written into the notifications of every follower of its author
+# a background job, enqueued with fan_out_checklist.delay() by the publishing views
+# followers are read and written in chunks, each bulk_create commits on its own, so no chunk holds a transaction for all followers
+from checklist.jobs import heartbeat, job
+from checklist.models import Checklist, Follow, Notification
+from checklist.notifications import (
+    invalidate_latest_notification_id,
+    publish_notifications,
+)
+
+FANOUT_BATCH_SIZE = 2000
+
+
+@job
+def fan_out_checklist(checklist_id, batch_size=FANOUT_BATCH_SIZE):
+    # returns the number of followers reached; running it again adds nothing, rows conflicting on the notification key are skipped
+    checklist = Checklist.objects.filter(id=checklist_id, is_draft=False).first()
+    if checklist is None:
+        return 0
+
+    total = 0
+    last_id = 0
+    while True:
+        # keyset pagination over the author's followers, every chunk is an index range scan
+        follows = list(
+            Follow.objects.filter(toUser_id=checklist.author_id, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "fromUser_id")[:batch_size]
+        )
+        if not follows:
+            return total
+        last_id = follows[-1][0]
+
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    fromUser_id=checklist.author_id,
+                    toUser_id=follower_id,
+                    notif_type=Notification.NEW_CHECKLIST,
+                    checklist_id=checklist.id,
+                    recent_actors=str(checklist.author_id),
+                )
+                for _, follower_id in follows
+            ],
+            ignore_conflicts=True,
+        )
+        follower_ids = [follower_id for _, follower_id in follows]
+        invalidate_latest_notification_id(follower_ids)
+        # bulk_create does not set ids on every database, the rows are found by their key
+        publish_notifications(
+            follower_ids,
+            notif_type=Notification.NEW_CHECKLIST,
+            checklist_id=checklist.id,
+        )
+        total += len(follows)
+        # the fan-out to an author with many followers can run for longer than LOCK_TIMEOUT_SECONDS
+        heartbeat()
@@ -0,0 +1,174 @@
+# background jobs kept in the checklist_job table and run by "manage.py run_worker", so requests only do their essential write
+# .delay() inserts the job row on the connection of its caller: called inside the transaction.atomic() block of the write it belongs
+# to, the row commits with that write and a worker never sees it before; called outside one, it commits on its own
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from checklist.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+# a failed job is retried after 10s, 20s, 40s, ... at most an hour later
+BACKOFF_SECONDS = 10
+MAX_BACKOFF_SECONDS = 3600
+# a job not heard from for longer is taken to belong to a crashed worker and is claimed again; long jobs call heartbeat()
+LOCK_TIMEOUT_SECONDS = 600
+# heartbeat() writes at most this often
+HEARTBEAT_SECONDS = 60
+# workers racing for the same job on databases without SKIP LOCKED
+CLAIM_RETRIES = 5
+
+# job name -> function, filled by the job decorator when the module of a job is imported
+registry = {}
+# the job run by this thread, see heartbeat()
+running = threading.local()
+
+
+def job(func=None, *, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    # @job or @job(max_attempts=...) - func.delay(*args, **kwargs) enqueues a call, arguments must be json serializable
+    def decorate(func):
+        name = "{}.{}".format(func.__module__, func.__qualname__)
+        registry[name] = func
+
+        def delay(*args, **kwargs):
+            return enqueue(name, args, kwargs, max_attempts=max_attempts)
+
+        func.job_name = name
+        func.delay = delay
+        return func
+
+    if func is not None:
+        return decorate(func)
+    return decorate
+
+
+def enqueue(name, args=(), kwargs=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    return Job.objects.create(
+        name=name,
+        arguments=json.dumps({"args": list(args), "kwargs": kwargs or {}}),
+        max_attempts=max_attempts,
+    )
+
+
+def get_function(name):
+    if name not in registry:
+        # registers the jobs of the module
+        import_module(name.rsplit(".", 1)[0])
+    return registry[name]
+
+
+def get_backoff(attempts):
+    return timedelta(
+        seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    )
+
+
+def get_worker_name():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def claimable(now):
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    )
+
+
+def claim_job(worker):
+    # the next due job, marked as running by this worker; None when there is nothing to do
+    now = timezone.now()
+    jobs = Job.objects.filter(claimable(now)).order_by("run_at", "id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        # rows locked by other workers are skipped instead of waited for - refer https://www.postgresql.org/docs/current/sql-select.html#SQL-FOR-UPDATE-SHARE
+        with transaction.atomic():
+            claimed = jobs.select_for_update(skip_locked=True).first()
+            if claimed is None:
+                return None
+            claimed.status = Job.RUNNING
+            claimed.locked_at = now
+            claimed.locked_by = worker
+            claimed.attempts += 1
+            claimed.save(update_fields=["status", "locked_at", "locked_by", "attempts"])
+            return claimed
+
+    # SQLite has no row locks but serializes writers, so a conditional update hands a job to exactly one worker
+    for _ in range(CLAIM_RETRIES):
+        job_id = jobs.values_list("id", flat=True).first()
+        if job_id is None:
+            return None
+        updated = Job.objects.filter(claimable(now), id=job_id).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F("attempts") + 1,
+        )
+        if updated:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def heartbeat():
+    # called by a long job between its steps, so its lock does not time out while it runs; does nothing outside a worker
+    claimed = getattr(running, "job", None)
+    if claimed is None:
+        return
+    now = timezone.now()
+    if now - claimed.locked_at < timedelta(seconds=HEARTBEAT_SECONDS):
+        return
+    claimed.locked_at = now
+    Job.objects.filter(id=claimed.id, locked_by=claimed.locked_by).update(locked_at=now)
+
+
+def run_job(claimed):
+    # True when the job succeeded; its row is deleted then, failed rows are kept with their error
+    running.job = claimed
+    try:
+        arguments = json.loads(claimed.arguments)
+        get_function(claimed.name)(*arguments["args"], **arguments["kwargs"])
+    except Exception:
+        error = traceback.format_exc()
+        if claimed.attempts >= claimed.max_attempts:
+            status, run_at = Job.FAILED, claimed.run_at
+            logger.error(
+                "job %s %s failed for good:\n%s", claimed.id, claimed.name, error
+            )
+        else:
+            status, run_at = Job.QUEUED, timezone.now() + get_backoff(claimed.attempts)
+            logger.warning(
+                "job %s %s failed, retrying at %s", claimed.id, claimed.name, run_at
+            )
+        Job.objects.filter(id=claimed.id).update(
+            status=status, run_at=run_at, locked_at=None, locked_by="", last_error=error
+        )
+        return False
+    finally:
+        running.job = None
+
+    Job.objects.filter(id=claimed.id).delete()
+    return True
+
+
+def run_pending_jobs(worker=None, limit=None):
+    # runs due jobs until there are none left (or limit were run), returns (succeeded, failed)
+    worker = worker or get_worker_name()
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        claimed = claim_job(worker)
+        if claimed is None:
+            break
+        if run_job(claimed):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
@@ -0,0 +1,229 @@
+# benchmarks every route of checklist/urls.py and checklist_project/urls.py against the configured (seeded) database, e.g.
+# ./manage.py seed_scale --users 50000 --checklists 200000 --upvotes 2000000
+# ./manage.py benchmark_routes --output bench.json
+# ./manage.py benchmark_routes --baseline bench.json --fail-on-regression
+import json
+import math
+import time
+import tracemalloc
+from copy import deepcopy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+
+from checklist.middleware import QueryStats
+from checklist.models import Category, Checklist, Comment, Item, Notification
+from checklist.urls import urlpatterns as checklist_urlpatterns
+from checklist_project.urls import urlpatterns as project_urlpatterns
+
+# the "delete" item action is rolled back as well, but ticking an item is the common case
+SAMPLE_ACTION_TYPE = "complete"
+
+
+def get_routes():
+    # named url patterns declared directly in the two urls.py files; included apps (admin, social login, ...) are not ours to benchmark
+    routes = []
+    for pattern in list(checklist_urlpatterns) + list(project_urlpatterns):
+        if isinstance(pattern, URLPattern) and pattern.name:
+            routes.append((pattern.name, list(pattern.pattern.converters)))
+    return routes
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Report p50/p95 latency, query count and peak memory of every route as JSON, optionally compared against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--username",
+            help="User for the logged-in runs, defaults to the receiver of the latest notification",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--baseline", help="JSON report to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Relative p95 latency increase reported as a regression",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any route regressed against the baseline",
+        )
+
+    def get_samples(self, username):
+        checklist = (
+            Checklist.objects.filter(is_draft=False).order_by("-upvote_count").first()
+        )
+        if checklist is None:
+            raise CommandError("No checklists found, run 'manage.py seed_scale' first")
+
+        if username:
+            viewer = User.objects.filter(username=username).first()
+            if viewer is None:
+                raise CommandError(f"User '{username}' does not exist")
+        else:
+            latest_notif = Notification.objects.order_by("-id").first()
+            viewer = (
+                latest_notif.toUser
+                if latest_notif is not None
+                else User.objects.exclude(id=checklist.author_id).first()
+            )
+
+        item = checklist.item_set.first() or Item.objects.first()
+        comment = checklist.comments.first() or Comment.objects.first()
+        notif = Notification.objects.filter(toUser=viewer).first()
+        category = checklist.category or Category.objects.first()
+
+        return viewer, {
+            "checklist_id": checklist.id,
+            "username": checklist.author.username,
+            "query": checklist.title.split()[0],
+            "category": category.name if category else None,
+            "item_id": item.id if item else None,
+            "action_type": SAMPLE_ACTION_TYPE,
+            "id": notif.id if notif else None,
+            # password reset links are invalid on purpose, the view renders its "invalid link" page
+            "uidb64": "MQ",
+            "token": "invalid-token",
+            # "pk" means a different model depending on the route
+            "checklist-pk": checklist.id,
+            "item-pk": item.id if item else None,
+            "comment-pk": comment.id if comment else None,
+        }
+
+    def get_url(self, name, converters, samples):
+        kwargs = {}
+        for converter in converters:
+            if converter == "pk":
+                key = name.split("-")[0] + "-pk"
+            else:
+                key = converter
+            if samples.get(key) is None:
+                return None
+            kwargs[converter] = samples[key]
+
+        url = reverse(name, kwargs=kwargs)
+        if name == "search":
+            url += "?q=" + samples["query"]
+        return url
+
+    def measure(self, client, url, iterations):
+        # e.g. the logout route clears the session cookie, every request starts from the same cookies instead
+        cookies = deepcopy(client.cookies)
+
+        def request():
+            client.cookies = deepcopy(cookies)
+            # every request is rolled back so toggles and deletes leave the dataset unchanged between iterations
+            with transaction.atomic():
+                response = client.get(url)
+                transaction.set_rollback(True)
+            return response
+
+        # warm up caches and lazily imported modules
+        request()
+
+        # counted with an execute wrapper since the test client resets connection.queries on every request
+        query_stats = QueryStats()
+        with connection.execute_wrapper(query_stats):
+            response = request()
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # separate pass since tracing allocations slows the request down
+        tracemalloc.start()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        client.cookies = cookies
+        return {
+            "status": response.status_code,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "queries": query_stats.count,
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    def compare(self, report, baseline, threshold):
+        regressions = []
+        for route, result in report["routes"].items():
+            previous = baseline["routes"].get(route)
+            if previous is None:
+                continue
+            if result["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{route}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms"
+                )
+            if result["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{route}: queries {previous['queries']} -> {result['queries']}"
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        viewer, samples = self.get_samples(options["username"])
+
+        report = {
+            "iterations": options["iterations"],
+            "viewer": viewer.username,
+            "checklists": Checklist.objects.count(),
+            "routes": {},
+        }
+
+        # the test client sends "testserver" as host
+        with override_settings(
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"]
+        ):
+            anonymous_client = Client()
+            logged_in_client = Client()
+            logged_in_client.force_login(viewer)
+
+            for name, converters in get_routes():
+                url = self.get_url(name, converters, samples)
+                if url is None:
+                    self.stderr.write(f"Skipping {name}: no sample data")
+                    continue
+
+                for label, client in (
+                    ("anonymous", anonymous_client),
+                    ("logged_in", logged_in_client),
+                ):
+                    result = self.measure(client, url, options["iterations"])
+                    result["url"] = url
+                    report["routes"][f"{name} [{label}]"] = result
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as fp:
+                fp.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as fp:
+                baseline = json.load(fp)
+
+            regressions = self.compare(report, baseline, options["threshold"])
+            for regression in regressions:
+                self.stderr.write("REGRESSION " + regression)
+
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} routes regressed")
+            if not regressions:
+                self.stderr.write(self.style.SUCCESS("No regressions against baseline"))
@@ -0,0 +1,75 @@
+# deletes old notifications, so the notification table and its inbox index stop growing with every upvote and follow
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from checklist.models import Notification
+
+RETENTION_DAYS = 90
+
+
+class Command(BaseCommand):
+    help = "Delete notifications older than the retention window in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=RETENTION_DAYS,
+            help="Keep notifications of the last this many days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of notifications deleted per DELETE statement",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches, letting other writers in",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        batch_size = options["batch_size"]
+
+        total = 0
+        last_user_id = 0
+        while True:
+            # ids do not follow date_notified - Notification.notify() inserts rows again, fan-out and seed_scale back-fill them -
+            # so the walk is by recipient instead, keyset paginated: the old notifications of a recipient are one range of
+            # notif_inbox_idx (toUser, date_notified), and no batch reads past the cutoff
+            user_ids = list(
+                User.objects.filter(id__gt=last_user_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+
+            while True:
+                # a range lookup instead of "toUser_id__in" stays within SQLite's parameter limit
+                ids = list(
+                    Notification.objects.filter(
+                        toUser_id__gte=user_ids[0],
+                        toUser_id__lte=last_user_id,
+                        date_notified__lt=cutoff,
+                    ).values_list("id", flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                # each batch commits on its own, no long transaction locks the table
+                deleted, _ = Notification.objects.filter(id__in=ids).delete()
+                total += deleted
+                time.sleep(options["sleep"])
+                if len(ids) < batch_size:
+                    break
+
+        # a cached latest id of a pruned notification only keeps a poll ETag unchanged for a minute, see checklist/notifications.py
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} notifications"))
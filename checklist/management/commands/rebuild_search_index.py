@@ -0,0 +1,21 @@
+# repopulates the full-text index (checklist/search.py) from the checklist table, e.g. after rows were imported without Checklist.save()
+from django.core.management.base import BaseCommand
+
+from checklist.search import is_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of published checklists"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write(
+                "Database has no full-text index, search scans checklists"
+            )
+            return
+
+        total = rebuild_search_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} checklists"))
@@ -0,0 +1,64 @@
+# custom management commands - refer https://docs.djangoproject.com/en/3.0/howto/custom-management-commands/
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from checklist.models import Checklist, Upvote
+
+
+def get_actual_upvote_count():
+    # correlated subquery counting the Upvote rows of the outer checklist
+    return Coalesce(
+        Subquery(
+            Upvote.objects.filter(checklist=OuterRef("pk"))
+            .order_by()
+            .values("checklist")
+            .annotate(cnt=Count("id"))
+            .values("cnt"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recompute Checklist.upvote_count for checklists whose counter has drifted from the Upvote table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of checklists updated per UPDATE statement",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many checklists have drifted",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # counters drift when upvotes are removed without going through upvote_checklist(), e.g. when a user is deleted
+        drifted_ids = list(
+            Checklist.objects.annotate(actual_upvote_count=get_actual_upvote_count())
+            .exclude(upvote_count=F("actual_upvote_count"))
+            .values_list("id", flat=True)
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted_ids)} checklists have drifted")
+            return
+
+        for start in range(0, len(drifted_ids), batch_size):
+            batch_ids = drifted_ids[start : start + batch_size]  # noqa: E203
+            Checklist.objects.filter(id__in=batch_ids).update(
+                upvote_count=get_actual_upvote_count()
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled upvote count of {len(drifted_ids)} checklists"
+            )
+        )
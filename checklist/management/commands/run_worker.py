@@ -0,0 +1,45 @@
+# runs the background jobs of checklist/jobs.py; start as many workers as needed, they never run the same job twice at once
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from checklist.jobs import get_worker_name, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before looking for due jobs again",
+        )
+
+    def handle(self, *args, **options):
+        worker = get_worker_name()
+        total_succeeded = total_failed = 0
+
+        try:
+            while True:
+                # like a request, a long running worker drops connections which were closed by the database
+                close_old_connections()
+                succeeded, failed = run_pending_jobs(worker)
+                total_succeeded += succeeded
+                total_failed += failed
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            f"Worker {worker} ran {total_succeeded} jobs, {total_failed} failed"
+        )
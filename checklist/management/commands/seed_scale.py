@@ -0,0 +1,351 @@
+# generates a large synthetic dataset to reveal scaling problems, e.g.
+# ./manage.py seed_scale --users 50000 --checklists 200000 --upvotes 2000000
+import random
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from checklist.models import (
+    Bookmark,
+    Category,
+    Checklist,
+    Comment,
+    Follow,
+    Item,
+    Notification,
+    Upvote,
+    make_excerpt,
+)
+from checklist.sanitize import sanitize_html
+from checklist.search import rebuild_search_index
+from users.models import Profile
+
+WORDS = (
+    "plan pack travel budget clean garden repair launch review test deploy "
+    "write read study cook shop move paint fix build order call book check "
+    "weekly daily house office car trip party wedding exam project website "
+    "kitchen garage report invoice backup server laptop bike camping holiday"
+).split()
+
+# all generated rows are dated within this window so runs with the same seed are identical
+START_DATE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+DATE_RANGE_SECONDS = 2 * 365 * 24 * 60 * 60
+
+
+def bulk_create_in_batches(model, objs, batch_size):
+    # objs is a generator, so at most batch_size unsaved objects are held in memory
+    objs = iter(objs)
+    total = 0
+    while True:
+        batch = list(islice(objs, batch_size))
+        if not batch:
+            return total
+        # django splits each batch further if the database limits the number of rows per INSERT
+        model.objects.bulk_create(batch)
+        total += len(batch)
+
+
+def sample_indices(rng, count, space):
+    # distinct indices into a cross product, drawn without materialising it; stored as 8 byte ints to keep millions of them small
+    return array("q", rng.sample(range(space), min(count, space)))
+
+
+def sample_pairs(rng, count, left_ids, right_ids, exclude_same=False):
+    # distinct (left, right) pairs
+    for index in sample_indices(rng, count, len(left_ids) * len(right_ids)):
+        left = left_ids[index // len(right_ids)]
+        right = right_ids[index % len(right_ids)]
+        if exclude_same and left == right:
+            continue
+        yield left, right
+
+
+class Command(BaseCommand):
+    help = "Generate a large, deterministic synthetic dataset with bulk_create for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix of generated usernames and category names",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--checklists", type=int, default=5000)
+        parser.add_argument(
+            "--items", type=int, default=5, help="Items per checklist (at most)"
+        )
+        parser.add_argument("--upvotes", type=int, default=20000)
+        parser.add_argument("--bookmarks", type=int, default=5000)
+        parser.add_argument("--follows", type=int, default=5000)
+        parser.add_argument(
+            "--comments",
+            type=int,
+            default=5000,
+            help="Top level comments, each gets up to 3 replies",
+        )
+        parser.add_argument("--notifications", type=int, default=20000)
+        parser.add_argument(
+            "--draft-ratio",
+            type=float,
+            default=0.05,
+            help="Fraction of checklists saved as drafts",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch_size = options["batch_size"]
+
+        if User.objects.filter(username__startswith=prefix + "_user_").exists():
+            raise CommandError(
+                f"Users with prefix '{prefix}' already exist, use another --prefix"
+            )
+
+        def random_date():
+            return START_DATE + timedelta(seconds=rng.randrange(DATE_RANGE_SECONDS))
+
+        def random_text(min_words, max_words):
+            return " ".join(
+                rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))
+            )
+
+        # USERS AND PROFILES - bulk_create does not send post_save, so profiles are created here instead of by users.signals
+        password = make_password("password")
+        bulk_create_in_batches(
+            User,
+            (
+                User(
+                    username=f"{prefix}_user_{i}",
+                    password=password,
+                    date_joined=random_date(),
+                )
+                for i in range(options["users"])
+            ),
+            batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=prefix + "_user_")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        bulk_create_in_batches(
+            Profile, (Profile(user_id=user_id) for user_id in user_ids), batch_size
+        )
+        self.stdout.write(f"Created {len(user_ids)} users and profiles")
+
+        # CATEGORIES
+        bulk_create_in_batches(
+            Category,
+            (
+                Category(name=f"{prefix}_category_{i}"[:30])
+                for i in range(options["categories"])
+            ),
+            batch_size,
+        )
+        category_ids = list(
+            Category.objects.filter(name__startswith=prefix + "_category_")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.stdout.write(f"Created {len(category_ids)} categories")
+
+        # upvotes are drawn over checklist positions first, so the denormalized upvote_count can be set when the checklists are created
+        checklist_count = options["checklists"]
+        upvote_indices = sample_indices(
+            rng, options["upvotes"], len(user_ids) * checklist_count
+        )
+        upvote_counts = array("q", [0]) * checklist_count
+        for index in upvote_indices:
+            upvote_counts[index % checklist_count] += 1
+
+        # CHECKLISTS - sanitized content and excerpt are normally computed by Checklist.save(), which bulk_create skips
+        def random_checklist(position):
+            title = random_text(2, 6)[:100]
+            content = "<p>" + random_text(20, 120) + "</p>"
+            content_html, content_text = sanitize_html(content)
+            return Checklist(
+                title=title,
+                content=content,
+                content_html=content_html,
+                content_text=content_text,
+                excerpt=make_excerpt(content_text),
+                date_posted=random_date(),
+                author_id=rng.choice(user_ids),
+                category_id=rng.choice(category_ids) if category_ids else None,
+                is_draft=rng.random() < options["draft_ratio"],
+                upvote_count=upvote_counts[position],
+            )
+
+        bulk_create_in_batches(
+            Checklist,
+            (random_checklist(position) for position in range(checklist_count)),
+            batch_size,
+        )
+        # the generated users have no other checklists and ids follow insertion order, so checklist_ids[position] is the checklist at that position
+        # filter on the username prefix rather than "id__in" which would exceed SQLite's parameter limit
+        author_of = dict(
+            Checklist.objects.filter(author__username__startswith=prefix + "_user_")
+            .order_by("id")
+            .values_list("id", "author_id")
+        )
+        checklist_ids = list(author_of)
+        self.stdout.write(f"Created {len(checklist_ids)} checklists")
+
+        # ITEMS
+        total = bulk_create_in_batches(
+            Item,
+            (
+                Item(
+                    title=random_text(1, 5)[:100],
+                    completed=rng.random() < 0.3,
+                    checklist_id=checklist_id,
+                )
+                for checklist_id in checklist_ids
+                for _ in range(rng.randint(0, options["items"]))
+            ),
+            batch_size,
+        )
+        self.stdout.write(f"Created {total} items")
+
+        # bulk_create does not send post_save either, which keeps the full-text index in sync
+        total = rebuild_search_index(batch_size=batch_size)
+        self.stdout.write(f"Indexed {total} checklists for search")
+
+        # UPVOTES, BOOKMARKS, FOLLOWS
+        total = bulk_create_in_batches(
+            Upvote,
+            (
+                Upvote(
+                    user_id=user_ids[index // checklist_count],
+                    checklist_id=checklist_ids[index % checklist_count],
+                )
+                for index in upvote_indices
+            ),
+            batch_size,
+        )
+        self.stdout.write(f"Created {total} upvotes")
+
+        total = bulk_create_in_batches(
+            Bookmark,
+            (
+                Bookmark(user_id=user_id, checklist_id=checklist_id)
+                for user_id, checklist_id in sample_pairs(
+                    rng, options["bookmarks"], user_ids, checklist_ids
+                )
+            ),
+            batch_size,
+        )
+        self.stdout.write(f"Created {total} bookmarks")
+
+        total = bulk_create_in_batches(
+            Follow,
+            (
+                Follow(fromUser_id=from_id, toUser_id=to_id)
+                for from_id, to_id in sample_pairs(
+                    rng, options["follows"], user_ids, user_ids, exclude_same=True
+                )
+            ),
+            batch_size,
+        )
+        self.stdout.write(f"Created {total} follows")
+
+        # COMMENT THREADS - top level comments first, replies need their ids; bodies are sanitized here as Comment.save() would
+        def random_comment(**fields):
+            fields["body_html"], fields["body_text"] = sanitize_html(fields["body"])
+            return Comment(**fields)
+
+        bulk_create_in_batches(
+            Comment,
+            (
+                random_comment(
+                    checklist_id=rng.choice(checklist_ids),
+                    user_id=rng.choice(user_ids),
+                    body="<p>" + random_text(5, 40) + "</p>",
+                    created_on=random_date(),
+                )
+                for _ in range(options["comments"] if checklist_ids else 0)
+            ),
+            batch_size,
+        )
+        parents = list(
+            Comment.objects.filter(
+                checklist__author__username__startswith=prefix + "_user_",
+                parent__isnull=True,
+            )
+            .order_by("id")
+            .values_list("id", "checklist_id", "created_on")
+        )
+        total = bulk_create_in_batches(
+            Comment,
+            (
+                random_comment(
+                    checklist_id=checklist_id,
+                    user_id=rng.choice(user_ids),
+                    body="<p>" + random_text(3, 20) + "</p>",
+                    created_on=created_on + timedelta(minutes=rng.randint(1, 10000)),
+                    parent_id=parent_id,
+                )
+                for parent_id, checklist_id, created_on in parents
+                for _ in range(rng.randint(0, 3))
+            ),
+            batch_size,
+        )
+        self.stdout.write(f"Created {len(parents)} comments and {total} replies")
+
+        # NOTIFICATIONS
+        def random_notification():
+            notif_type = rng.choice(
+                (
+                    Notification.UPVOTE,
+                    Notification.USER_FOLLOW,
+                    Notification.CHECKLIST_FOLLOW,
+                )
+            )
+            from_id = rng.choice(user_ids)
+            if notif_type == Notification.USER_FOLLOW:
+                return Notification(
+                    fromUser_id=from_id,
+                    toUser_id=rng.choice(user_ids),
+                    notif_type=notif_type,
+                    date_notified=random_date(),
+                )
+
+            checklist_id = rng.choice(checklist_ids)
+            return Notification(
+                fromUser_id=from_id,
+                toUser_id=author_of[checklist_id],
+                notif_type=notif_type,
+                checklist_id=checklist_id,
+                date_notified=random_date(),
+            )
+
+        # coalesced by (toUser, notif_type, checklist) in date order, as Notification.notify() does one action at a time
+        actions = sorted(
+            (
+                random_notification()
+                for _ in range(options["notifications"] if checklist_ids else 0)
+            ),
+            key=lambda notif: notif.date_notified,
+        )
+        coalesced = {}
+        for action in actions:
+            key = (action.toUser_id, action.notif_type, action.checklist_id)
+            notif = coalesced.get(key)
+            if notif is None:
+                notif = coalesced[key] = action
+                notif.actor_count = 0
+            notif.date_notified = action.date_notified
+            notif.add_actor(action.fromUser_id)
+
+        total = bulk_create_in_batches(Notification, coalesced.values(), batch_size)
+        self.stdout.write(f"Created {total} notifications from {len(actions)} actions")
+
+        self.stdout.write(self.style.SUCCESS("Seeding complete"))
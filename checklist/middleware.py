@@ -0,0 +1,59 @@
+# per-view SQL instrumentation - refer https://docs.djangoproject.com/en/3.0/topics/db/instrumentation/
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    # execute wrapper installed on the database connection for the duration of a request
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryStatsMiddleware:
+    def __init__(self, get_response):
+        # only enabled with QUERY_STATS_ENABLED, otherwise django drops the middleware at startup
+        if not getattr(settings, "QUERY_STATS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_stats = QueryStats()
+
+        with connection.execute_wrapper(query_stats):
+            response = self.get_response(request)
+
+        # name of the url pattern in urls.py, e.g. "checklist-home"
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        else:
+            view_name = None
+
+        db_time = query_stats.duration * 1000
+        response["X-DB-Query-Count"] = str(query_stats.count)
+        response["X-DB-Time-Ms"] = "%.2f" % db_time
+
+        logger.info(
+            "%s %s view=%s queries=%d db_time=%.2fms",
+            request.method,
+            request.path,
+            view_name,
+            query_stats.count,
+            db_time,
+        )
+
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.4 on 2026-10-17 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0021_comment_parent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="checklist",
+            index=models.Index(
+                fields=["is_draft", "date_posted", "id"], name="checklist_feed_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.4 on 2026-10-17 15:02
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_upvote_count(apps, schema_editor):
+    Checklist = apps.get_model("checklist", "Checklist")
+    Upvote = apps.get_model("checklist", "Upvote")
+
+    Checklist.objects.update(
+        upvote_count=Coalesce(
+            Subquery(
+                Upvote.objects.filter(checklist=OuterRef("pk"))
+                .order_by()
+                .values("checklist")
+                .annotate(cnt=Count("id"))
+                .values("cnt"),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0022_checklist_feed_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="checklist",
+            name="upvote_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_upvote_count, migrations.RunPython.noop),
+    ]
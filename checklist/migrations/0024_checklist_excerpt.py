@@ -0,0 +1,46 @@
+# Generated by Django 3.0.4 on 2026-10-17 16:20
+
+import html
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+BATCH_SIZE = 1000
+EXCERPT_LENGTH = 300
+
+
+# frozen copy of checklist.models.make_excerpt as of this migration, so later changes to it cannot change what this migration does
+def make_excerpt(content):
+    # tags are replaced by a space so words of adjacent paragraphs and list items are not glued together
+    text = html.unescape(strip_tags(content.replace("<", " <")))
+    return Truncator(" ".join(text.split())).chars(EXCERPT_LENGTH)
+
+
+def populate_excerpt(apps, schema_editor):
+    Checklist = apps.get_model("checklist", "Checklist")
+
+    batch = []
+    for checklist in Checklist.objects.only("id", "content").iterator():
+        checklist.excerpt = make_excerpt(checklist.content)
+        batch.append(checklist)
+        if len(batch) == BATCH_SIZE:
+            Checklist.objects.bulk_update(batch, ["excerpt"])
+            batch = []
+    Checklist.objects.bulk_update(batch, ["excerpt"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0023_checklist_upvote_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="checklist",
+            name="excerpt",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(populate_excerpt, migrations.RunPython.noop),
+    ]
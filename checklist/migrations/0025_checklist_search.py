@@ -0,0 +1,79 @@
+# Generated by Django 3.0.4 on 2026-10-17 17:05
+
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 1000
+
+# frozen copies of the statements in checklist/search.py as of this migration, so later changes there cannot change what it does
+# RunSQL cannot pick statements by database vendor, hence RunPython; other databases get no index
+CREATE_SQL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE checklist_search USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')",
+    ],
+    "postgresql": [
+        "CREATE TABLE checklist_search (checklist_id integer PRIMARY KEY REFERENCES checklist_checklist (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)",
+        "CREATE INDEX checklist_search_document_idx ON checklist_search USING GIN (document)",
+    ],
+}
+
+DROP_SQL = {
+    "sqlite": ["DROP TABLE checklist_search"],
+    "postgresql": ["DROP TABLE checklist_search"],
+}
+
+INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_search (rowid, title, body) VALUES (%s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_search (checklist_id, document) VALUES "
+        "(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))"
+    ),
+}
+
+
+def html_to_text(content):
+    # tags are replaced by a space so words of adjacent paragraphs and list items are not glued together
+    text = html.unescape(strip_tags(content.replace("<", " <")))
+    return " ".join(text.split())
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+
+    for sql in CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+
+    Checklist = apps.get_model("checklist", "Checklist")
+    rows = (
+        Checklist.objects.filter(is_draft=False)
+        .order_by("id")
+        .values_list("id", "title", "content")
+    )
+    batch = []
+    with schema_editor.connection.cursor() as cursor:
+        for checklist_id, title, content in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append((checklist_id, title, html_to_text(content)))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(INSERT_SQL[vendor], batch)
+                batch = []
+        cursor.executemany(INSERT_SQL[vendor], batch)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0024_checklist_excerpt"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,182 @@
+# Generated by Django 3.0.4 on 2026-10-17 18:10
+
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 1000
+
+# frozen copies of the statements in checklist/search.py as of this migration, so later changes there cannot change what it does
+# RunSQL cannot pick statements by database vendor, hence RunPython; other databases get no index
+CREATE_SQL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE checklist_search USING fts5(title, body, items, tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE checklist_item_search USING fts5(title, checklist_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    ],
+    "postgresql": [
+        "CREATE TABLE checklist_search (checklist_id integer PRIMARY KEY REFERENCES checklist_checklist (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)",
+        "CREATE INDEX checklist_search_document_idx ON checklist_search USING GIN (document)",
+        "CREATE TABLE checklist_item_search (item_id integer PRIMARY KEY REFERENCES checklist_item (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, checklist_id integer NOT NULL, title text NOT NULL, document tsvector NOT NULL)",
+        "CREATE INDEX checklist_item_search_document_idx ON checklist_item_search USING GIN (document)",
+        "CREATE INDEX checklist_item_search_checklist_idx ON checklist_item_search (checklist_id)",
+    ],
+}
+
+DROP_SQL = {
+    "sqlite": [
+        "DROP TABLE IF EXISTS checklist_search",
+        "DROP TABLE IF EXISTS checklist_item_search",
+    ],
+    "postgresql": [
+        "DROP TABLE IF EXISTS checklist_search",
+        "DROP TABLE IF EXISTS checklist_item_search",
+    ],
+}
+
+INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_search (rowid, title, body, items) VALUES (%s, %s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_search (checklist_id, document) VALUES "
+        "(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+        "|| setweight(to_tsvector('simple', %s), 'C'))"
+    ),
+}
+
+# the checklist table as 0025_checklist_search left it, for unapplying this migration
+PREVIOUS_CREATE_SQL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE checklist_search USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')",
+    ],
+    "postgresql": [
+        "CREATE TABLE checklist_search (checklist_id integer PRIMARY KEY REFERENCES checklist_checklist (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)",
+        "CREATE INDEX checklist_search_document_idx ON checklist_search USING GIN (document)",
+    ],
+}
+
+PREVIOUS_INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_search (rowid, title, body) VALUES (%s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_search (checklist_id, document) VALUES "
+        "(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))"
+    ),
+}
+
+ITEM_INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_item_search (rowid, checklist_id, title) VALUES (%s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_item_search (item_id, checklist_id, title, document) "
+        "VALUES (%s, %s, %s, to_tsvector('simple', %s))"
+    ),
+}
+
+
+def html_to_text(content):
+    # tags are replaced by a space so words of adjacent paragraphs and list items are not glued together
+    text = html.unescape(strip_tags(content.replace("<", " <")))
+    return " ".join(text.split())
+
+
+def in_batches(rows):
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_items_text(Item, checklist_ids):
+    # a range lookup instead of "checklist_id__in" stays within SQLite's parameter limit
+    titles = {}
+    item_titles = (
+        Item.objects.filter(
+            checklist_id__gte=min(checklist_ids), checklist_id__lte=max(checklist_ids)
+        )
+        .order_by("id")
+        .values_list("checklist_id", "title")
+    )
+    for checklist_id, title in item_titles:
+        titles.setdefault(checklist_id, []).append(title)
+    return {
+        checklist_id: "\n".join(item_list) for checklist_id, item_list in titles.items()
+    }
+
+
+def recreate_search_index(apps, schema_editor):
+    # the checklist table gets an "items" column and item titles a table of their own
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+
+    for sql in DROP_SQL[vendor] + CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+
+    Checklist = apps.get_model("checklist", "Checklist")
+    Item = apps.get_model("checklist", "Item")
+
+    with schema_editor.connection.cursor() as cursor:
+        items = Item.objects.order_by("id").values_list("id", "checklist_id", "title")
+        for batch in in_batches(items):
+            if vendor != "sqlite":
+                batch = [row + (row[2],) for row in batch]
+            cursor.executemany(ITEM_INSERT_SQL[vendor], batch)
+
+        rows = (
+            Checklist.objects.filter(is_draft=False)
+            .order_by("id")
+            .values_list("id", "title", "content")
+        )
+        for batch in in_batches(rows):
+            items_text = get_items_text(Item, [row[0] for row in batch])
+            cursor.executemany(
+                INSERT_SQL[vendor],
+                [
+                    (
+                        checklist_id,
+                        title,
+                        html_to_text(content),
+                        items_text.get(checklist_id, ""),
+                    )
+                    for checklist_id, title, content in batch
+                ],
+            )
+
+
+def restore_search_index(apps, schema_editor):
+    # drops the item table and puts back the checklist table without items, which unapplying 0025 then drops
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+
+    for sql in DROP_SQL[vendor] + PREVIOUS_CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+
+    Checklist = apps.get_model("checklist", "Checklist")
+    rows = (
+        Checklist.objects.filter(is_draft=False)
+        .order_by("id")
+        .values_list("id", "title", "content")
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for batch in in_batches(rows):
+            cursor.executemany(
+                PREVIOUS_INSERT_SQL[vendor],
+                [
+                    (checklist_id, title, html_to_text(content))
+                    for checklist_id, title, content in batch
+                ],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0025_checklist_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_search_index, restore_search_index),
+    ]
@@ -0,0 +1,324 @@
+# Generated by Django 3.0.4 on 2026-10-17 19:30
+
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+BATCH_SIZE = 1000
+EXCERPT_LENGTH = 300
+
+# frozen copies of checklist/sanitize.py, checklist.models.make_excerpt and the index statements in checklist/search.py as of
+# this migration, so later changes there cannot change what it does
+
+# what the rich text editor produces; anything else is dropped while its text is kept
+ALLOWED_TAGS = {
+    "a",
+    "b",
+    "blockquote",
+    "br",
+    "code",
+    "del",
+    "div",
+    "em",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "i",
+    "img",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "s",
+    "span",
+    "strong",
+    "sub",
+    "sup",
+    "table",
+    "tbody",
+    "td",
+    "tfoot",
+    "th",
+    "thead",
+    "tr",
+    "u",
+    "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_SCHEMES = {"", "http", "https", "mailto"}
+VOID_TAGS = {"br", "hr", "img"}
+# dropped together with everything inside them
+DROPPED_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript"}
+# their boundaries separate words in the plain text
+BLOCK_TAGS = {
+    "blockquote",
+    "br",
+    "div",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "li",
+    "p",
+    "pre",
+    "td",
+    "th",
+    "tr",
+}
+
+# browsers ignore whitespace and control characters inside a scheme, "java\nscript:" is still javascript
+IGNORED_URL_CHARACTERS = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def is_safe_url(url):
+    try:
+        scheme = urlsplit(IGNORED_URL_CHARACTERS.sub("", url)).scheme
+    except ValueError:
+        return False
+    return scheme.lower() in ALLOWED_SCHEMES
+
+
+class Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        # allowed tags left open, closed at the end so markup cannot leak out of the content
+        self.open_tags = []
+        self.dropped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth += 1
+            return
+        if self.dropped_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attributes = "".join(
+            ' {}="{}"'.format(name, html.escape(value))
+            for name, value in attrs
+            if name in allowed
+            and value is not None
+            and (name not in URL_ATTRIBUTES or is_safe_url(value))
+        )
+        if tag == "a":
+            attributes += ' rel="nofollow noopener"'
+        self.html.append("<{}{}>".format(tag, attributes))
+
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag not in DROPPED_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth = max(self.dropped_depth - 1, 0)
+            return
+        if self.dropped_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        # stray closing tags are ignored, tags left open inside this one are closed with it
+        if tag in self.open_tags:
+            while True:
+                open_tag = self.open_tags.pop()
+                self.html.append("</{}>".format(open_tag))
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.dropped_depth:
+            return
+        self.html.append(html.escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append("</{}>".format(self.open_tags.pop()))
+
+
+def sanitize_html(content):
+    # (sanitized html safe to render with |safe, whitespace collapsed plain text for search and excerpts)
+    sanitizer = Sanitizer()
+    sanitizer.feed(content or "")
+    sanitizer.close()
+    return "".join(sanitizer.html), " ".join("".join(sanitizer.text).split())
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
+
+# RunSQL cannot pick statements by database vendor, the index is refilled for the vendors 0026_item_search created it for
+CLEAR_SQL = ["DELETE FROM checklist_search", "DELETE FROM checklist_item_search"]
+
+INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_search (rowid, title, body, items) VALUES (%s, %s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_search (checklist_id, document) VALUES "
+        "(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+        "|| setweight(to_tsvector('simple', %s), 'C'))"
+    ),
+}
+
+ITEM_INSERT_SQL = {
+    "sqlite": "INSERT INTO checklist_item_search (rowid, checklist_id, title) VALUES (%s, %s, %s)",
+    "postgresql": (
+        "INSERT INTO checklist_item_search (item_id, checklist_id, title, document) "
+        "VALUES (%s, %s, %s, to_tsvector('simple', %s))"
+    ),
+}
+
+
+def in_batches(rows):
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_items_text(Item, checklist_ids):
+    # a range lookup instead of "checklist_id__in" stays within SQLite's parameter limit
+    titles = {}
+    item_titles = (
+        Item.objects.filter(
+            checklist_id__gte=min(checklist_ids), checklist_id__lte=max(checklist_ids)
+        )
+        .order_by("id")
+        .values_list("checklist_id", "title")
+    )
+    for checklist_id, title in item_titles:
+        titles.setdefault(checklist_id, []).append(title)
+    return {
+        checklist_id: "\n".join(item_list) for checklist_id, item_list in titles.items()
+    }
+
+
+def rebuild_search_index(schema_editor, Checklist, Item):
+    vendor = schema_editor.connection.vendor
+    if vendor not in INSERT_SQL:
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CLEAR_SQL:
+            cursor.execute(sql)
+
+        items = Item.objects.order_by("id").values_list("id", "checklist_id", "title")
+        for batch in in_batches(items):
+            if vendor != "sqlite":
+                batch = [row + (row[2],) for row in batch]
+            cursor.executemany(ITEM_INSERT_SQL[vendor], batch)
+
+        rows = (
+            Checklist.objects.filter(is_draft=False)
+            .order_by("id")
+            .values_list("id", "title", "content_text")
+        )
+        for batch in in_batches(rows):
+            items_text = get_items_text(Item, [row[0] for row in batch])
+            cursor.executemany(
+                INSERT_SQL[vendor],
+                [
+                    (checklist_id, title, text, items_text.get(checklist_id, ""))
+                    for checklist_id, title, text in batch
+                ],
+            )
+
+
+def populate_sanitized_content(apps, schema_editor):
+    Checklist = apps.get_model("checklist", "Checklist")
+    Comment = apps.get_model("checklist", "Comment")
+    Item = apps.get_model("checklist", "Item")
+
+    batch = []
+    for checklist in Checklist.objects.only("id", "content").iterator():
+        checklist.content_html, checklist.content_text = sanitize_html(
+            checklist.content
+        )
+        checklist.excerpt = make_excerpt(checklist.content_text)
+        batch.append(checklist)
+        if len(batch) == BATCH_SIZE:
+            Checklist.objects.bulk_update(
+                batch, ["content_html", "content_text", "excerpt"]
+            )
+            batch = []
+    Checklist.objects.bulk_update(batch, ["content_html", "content_text", "excerpt"])
+
+    batch = []
+    for comment in Comment.objects.only("id", "body").iterator():
+        comment.body_html, comment.body_text = sanitize_html(comment.body)
+        batch.append(comment)
+        if len(batch) == BATCH_SIZE:
+            Comment.objects.bulk_update(batch, ["body_html", "body_text"])
+            batch = []
+    Comment.objects.bulk_update(batch, ["body_html", "body_text"])
+
+    # the search index is built from content_text
+    rebuild_search_index(schema_editor, Checklist, Item)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0026_item_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="checklist",
+            name="content_html",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="checklist",
+            name="content_text",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="body_html",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="body_text",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(populate_sanitized_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.4 on 2026-10-17 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0027_sanitized_content"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["toUser", "date_notified"], name="notif_inbox_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.0.4 on 2026-10-17 20:10
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+RECENT_ACTORS = 3
+
+
+def coalesce_notifications(apps, schema_editor):
+    # merge the rows of every (toUser, notif_type, checklist) into its latest one, ahead of the unique constraints of 0030
+    Notification = apps.get_model("checklist", "Notification")
+
+    rows = (
+        Notification.objects.order_by(
+            "toUser_id", "notif_type", "checklist_id", "-date_notified", "-id"
+        )
+        .values_list("id", "toUser_id", "notif_type", "checklist_id", "fromUser_id")
+        .iterator()
+    )
+
+    updates = []
+    delete_ids = []
+
+    def flush():
+        Notification.objects.bulk_update(updates, ["actor_count", "recent_actors"])
+        for start in range(0, len(delete_ids), BATCH_SIZE):
+            end = start + BATCH_SIZE
+            Notification.objects.filter(id__in=delete_ids[start:end]).delete()
+        updates.clear()
+        delete_ids.clear()
+
+    for _, group in groupby(rows, key=lambda row: row[1:4]):
+        group = list(group)
+        actor_ids = list(dict.fromkeys(row[4] for row in group))
+        updates.append(
+            Notification(
+                id=group[0][0],
+                actor_count=len(actor_ids),
+                recent_actors=",".join(map(str, actor_ids[:RECENT_ACTORS])),
+            )
+        )
+        delete_ids.extend(row[0] for row in group[1:])
+        if len(updates) >= BATCH_SIZE:
+            flush()
+    flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0028_notification_inbox_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="actor_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="recent_actors",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.RunPython(coalesce_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.4 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0029_notification_actors"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                fields=("toUser", "notif_type", "checklist"), name="notif_coalesce_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(checklist__isnull=True),
+                fields=("toUser", "notif_type"),
+                name="notif_coalesce_no_checklist_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.0.4 on 2026-10-17 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0030_notification_coalesce_constraints"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="notif_type",
+            field=models.PositiveIntegerField(
+                choices=[
+                    (1, "upvote"),
+                    (2, "user_follow"),
+                    (3, "checklist_follow"),
+                    (4, "new_checklist"),
+                ],
+                default=1,
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.4 on 2026-10-17 15:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checklist", "0031_notification_new_checklist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=200)),
+                ("arguments", models.TextField(default="{}")),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "queued"), (2, "running"), (3, "failed")],
+                        default=1,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                ("run_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                ("locked_by", models.CharField(blank=True, default="", max_length=100)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["status", "run_at"], name="job_claim_idx"),
+        ),
+    ]
@@ -1,9 +1,21 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.text import Truncator
 from djrichtextfield.models import RichTextField
 
+from checklist.sanitize import sanitize_html
+
+EXCERPT_LENGTH = 300
+# feed and list cards only show the excerpt; every full copy of the body stays out of their queries
+FEED_DEFERRED_FIELDS = ("content", "content_html", "content_text")
+
+
+def make_excerpt(text):
+    # plain text preview of rich text content for feed cards, rendered escaped so no html from content reaches the feed
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
 
 class Checklist(models.Model):
     title = models.CharField(max_length=100)
@@ -14,21 +26,62 @@ class Checklist(models.Model):
     visibility = models.PositiveIntegerField(default=0)
     category = models.ForeignKey("Category", null=True, on_delete=models.SET_NULL)
     is_draft = models.BooleanField(default=False)
+    # denormalized count of Upvote rows, kept in sync by upvote_checklist() and repaired by "manage.py reconcile_upvote_counts"
+    upvote_count = models.PositiveIntegerField(default=0)
+    # computed from content on save(), so pages render content_html and search indexes content_text without parsing html per request
+    content_html = models.TextField(blank=True, default="", editable=False)
+    content_text = models.TextField(blank=True, default="", editable=False)
+    # lets feeds defer FEED_DEFERRED_FIELDS instead of loading and rendering the full rich text
+    excerpt = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        # feeds are ordered and cursor paginated by (date_posted, id)
+        indexes = [
+            models.Index(
+                fields=["is_draft", "date_posted", "id"], name="checklist_feed_idx"
+            )
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # instances loaded from a feed queryset have content deferred, it cannot have changed then
+        if "content" not in self.get_deferred_fields():
+            self.content_html, self.content_text = sanitize_html(self.content)
+            self.excerpt = make_excerpt(self.content_text)
+            # columns derived from content are written along with it
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "content" in update_fields:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    "content_html",
+                    "content_text",
+                    "excerpt",
+                }
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("checklist-detail", kwargs={"pk": self.id})
 
     @classmethod
     def get_checklists(cls, is_draft=False, author=None):
         if author is None:
-            return cls.objects.filter(is_draft=is_draft).order_by("-date_posted")
+            checklists = cls.objects.filter(is_draft=is_draft)
         else:
-            return Checklist.objects.filter(author=author, is_draft=is_draft).order_by(
-                "-date_posted"
-            )
+            checklists = cls.objects.filter(author=author, is_draft=is_draft)
+
+        # feed cards only show the excerpt
+        return (
+            cls.with_related(checklists)
+            .defer(*FEED_DEFERRED_FIELDS)
+            .order_by("-date_posted")
+        )
+
+    @staticmethod
+    def with_related(checklists):
+        # feed templates show author name, profile picture and category of every checklist; join them in instead of one query per row
+        return checklists.select_related("author__profile", "category")
 
 
 class Item(models.Model):
@@ -36,6 +89,17 @@ class Item(models.Model):
     completed = models.BooleanField(default=False)
     checklist = models.ForeignKey(Checklist, on_delete=models.CASCADE)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # what the search index holds for a loaded item, so saving it with only "completed" changed skips reindexing - refer
+        # https://docs.djangoproject.com/en/3.0/ref/models/instances/#customizing-model-loading
+        instance = super().from_db(db, field_names, values)
+        instance.indexed_values = instance.get_indexed_values()
+        return instance
+
+    def get_indexed_values(self):
+        return (self.title, self.checklist_id)
+
     def get_absolute_url(self):
         return reverse("item-detail", kwargs={"pk": self.id})
 
@@ -85,11 +149,13 @@ class Notification(models.Model):
     UPVOTE = 1
     USER_FOLLOW = 2
     CHECKLIST_FOLLOW = 3
+    NEW_CHECKLIST = 4
 
     NOTIF_CHOICES = (
         (UPVOTE, "upvote"),
         (USER_FOLLOW, "user_follow"),
         (CHECKLIST_FOLLOW, "checklist_follow"),
+        (NEW_CHECKLIST, "new_checklist"),
     )
 
     fromUser = models.ForeignKey(
@@ -103,6 +169,66 @@ class Notification(models.Model):
     checklist = models.ForeignKey(
         Checklist, on_delete=models.CASCADE, null=True, blank=True
     )
+    # notifications of the same type about the same checklist are coalesced into one row by notify(), fromUser is the latest actor
+    actor_count = models.PositiveIntegerField(default=1)
+    # comma separated ids of the latest distinct actors, newest first
+    recent_actors = models.CharField(max_length=100, blank=True, default="")
+
+    RECENT_ACTORS = 3
+
+    class Meta:
+        # the navbar dropdown reads the latest notifications of a user
+        indexes = [
+            models.Index(fields=["toUser", "date_notified"], name="notif_inbox_idx")
+        ]
+        # one row per (toUser, notif_type, checklist); NULLs are distinct in a unique index, so user follows need their own
+        constraints = [
+            models.UniqueConstraint(
+                fields=["toUser", "notif_type", "checklist"], name="notif_coalesce_uniq"
+            ),
+            models.UniqueConstraint(
+                fields=["toUser", "notif_type"],
+                condition=models.Q(checklist__isnull=True),
+                name="notif_coalesce_no_checklist_uniq",
+            ),
+        ]
+
+    def get_recent_actor_ids(self):
+        return [int(actor_id) for actor_id in self.recent_actors.split(",") if actor_id]
+
+    def add_actor(self, actor_id):
+        # only the latest actors are remembered, an actor acting again after dropping out of them is counted twice
+        actor_ids = self.get_recent_actor_ids()
+        if actor_id not in actor_ids:
+            self.actor_count += 1
+        actor_ids = [actor_id] + [other for other in actor_ids if other != actor_id]
+        self.recent_actors = ",".join(
+            str(other) for other in actor_ids[: self.RECENT_ACTORS]
+        )
+        self.fromUser_id = actor_id
+
+    @classmethod
+    def notify(cls, fromUser, toUser, notif_type, checklist=None):
+        # upsert into the row of (toUser, notif_type, checklist), so a popular checklist adds one row to its author's notifications
+        lookup = {"toUser": toUser, "notif_type": notif_type, "checklist": checklist}
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    notif = cls.objects.select_for_update().filter(**lookup).first()
+                    if notif is None:
+                        notif = cls(actor_count=0, **lookup)
+                    else:
+                        # moved to a new id, so polls for notifications newer than the ones seen pick up the change
+                        notif.delete()
+                        notif.pk = None
+                    notif.add_actor(fromUser.id)
+                    notif.date_notified = timezone.now()
+                    notif.save()
+                return notif
+            except IntegrityError:
+                # another request inserted the row first, update that one instead
+                if attempt:
+                    raise
 
 
 class Comment(models.Model):
@@ -111,6 +237,9 @@ class Comment(models.Model):
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="users")
     body = RichTextField()
+    # sanitized on save(), like Checklist.content_html
+    body_html = models.TextField(blank=True, default="", editable=False)
+    body_text = models.TextField(blank=True, default="", editable=False)
     created_on = models.DateTimeField(default=timezone.now)
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.CASCADE)
 
@@ -120,8 +249,49 @@ class Comment(models.Model):
     def __str__(self):
         return "Comment {} by {}".format(self.body, self.user.username)
 
+    def save(self, *args, **kwargs):
+        self.body_html, self.body_text = sanitize_html(self.body)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "body" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "body_html", "body_text"}
+        super().save(*args, **kwargs)
+
     def children(self):
-        return Comment.objects.filter(parent=self)
+        # reverse relation of parent, so replies prefetched by ChecklistDetailView are not queried again
+        return self.comment_set.all()
 
     def get_absolute_url(self):
         return reverse("checklist-detail", kwargs={"pk": self.checklist.id})
+
+
+class Job(models.Model):
+    # a call of a function decorated with checklist.jobs.job, waiting for "manage.py run_worker"
+    QUEUED = 1
+    RUNNING = 2
+    FAILED = 3
+
+    STATUS_CHOICES = (
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (FAILED, "failed"),
+    )
+
+    name = models.CharField(max_length=200)
+    # json of {"args": [...], "kwargs": {...}}
+    arguments = models.TextField(default="{}")
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # not run before, pushed back after every failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # workers look for the earliest due job
+        indexes = [models.Index(fields=["status", "run_at"], name="job_claim_idx")]
+
+    def __str__(self):
+        return "{} {}".format(self.name, self.get_status_display())
@@ -0,0 +1,116 @@
+# reading notifications for the navbar dropdown and the poll endpoint
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.urls import reverse
+
+from checklist.broker import get_broker
+from checklist.models import Notification
+
+LATEST_ID_KEY = "checklist:notif-latest:{}"
+# bounds how long a value cached by a poll racing with a new notification can be stale
+LATEST_ID_TIMEOUT = 60
+
+
+def load_actors(notifs):
+    # sets notif.actors (latest first) and notif.other_actor_count; the other recent actors of coalesced notifications are fetched in one query
+    other_ids = {
+        actor_id
+        for notif in notifs
+        for actor_id in notif.get_recent_actor_ids()
+        if actor_id != notif.fromUser_id
+    }
+    users = User.objects.in_bulk(other_ids) if other_ids else {}
+    for notif in notifs:
+        users[notif.fromUser_id] = notif.fromUser
+        notif.actors = [
+            users[actor_id]
+            for actor_id in notif.get_recent_actor_ids() or [notif.fromUser_id]
+            if actor_id in users
+        ]
+        notif.other_actor_count = max(notif.actor_count - len(notif.actors), 0)
+    return notifs
+
+
+def get_new_notifications(user_id, since, limit):
+    # the latest notifications with an id above since, newest first and with their actors loaded
+    return load_actors(
+        list(
+            Notification.objects.filter(toUser_id=user_id, id__gt=since)
+            .select_related("fromUser", "checklist")
+            .order_by("-id")[:limit]
+        )
+    )
+
+
+def get_latest_notification_id(user_id):
+    # id of the newest notification of a user, 0 without any; changed notifications get a new id, see Notification.notify()
+    key = LATEST_ID_KEY.format(user_id)
+    latest_id = cache.get(key)
+    if latest_id is None:
+        # index range scan on toUser
+        latest_id = (
+            Notification.objects.filter(toUser_id=user_id).aggregate(
+                latest_id=Max("id")
+            )["latest_id"]
+            or 0
+        )
+        cache.set(key, latest_id, LATEST_ID_TIMEOUT)
+    return latest_id
+
+
+def invalidate_latest_notification_id(user_ids):
+    # again once committed, a poll running meanwhile may have cached the id from before the change
+    keys = [LATEST_ID_KEY.format(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def publish_notifications(user_ids, **lookup):
+    # pushes the notifications of user_ids matching lookup through a shared broker once the transaction writing them committed,
+    # in whichever process wrote them; with the in-process broker the relay of each stream process reads them, see checklist/stream.py
+    broker = get_broker()
+    if not broker.shared:
+        return
+
+    def publish():
+        receivers = broker.subscribed_user_ids().intersection(user_ids)
+        if not receivers:
+            return
+        notifs = load_actors(
+            list(
+                Notification.objects.filter(toUser_id__in=receivers, **lookup)
+                .select_related("fromUser", "checklist")
+                .order_by("id")
+            )
+        )
+        for notif in notifs:
+            broker.publish(notif.toUser_id, serialize_notification(notif))
+
+    transaction.on_commit(publish)
+
+
+def serialize_notification(notif):
+    checklist = None
+    if notif.checklist is not None:
+        checklist = {
+            "id": notif.checklist.id,
+            "title": notif.checklist.title,
+            "url": notif.checklist.get_absolute_url(),
+        }
+
+    return {
+        "id": notif.id,
+        "type": notif.notif_type,
+        "date": notif.date_notified.isoformat(),
+        "actors": [
+            {
+                "username": actor.username,
+                "url": reverse("user-checklists", kwargs={"username": actor.username}),
+            }
+            for actor in notif.actors
+        ],
+        "other_actor_count": notif.other_actor_count,
+        "checklist": checklist,
+    }
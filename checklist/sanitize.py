@@ -0,0 +1,168 @@
+# allowlist sanitizer for the rich text of checklists and comments, run once on save() instead of on every page view
+# built on the standard library's html parser - refer https://docs.python.org/3/library/html.parser.html
+import html
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+# what the rich text editor produces; anything else is dropped while its text is kept
+ALLOWED_TAGS = {
+    "a",
+    "b",
+    "blockquote",
+    "br",
+    "code",
+    "del",
+    "div",
+    "em",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "i",
+    "img",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "s",
+    "span",
+    "strong",
+    "sub",
+    "sup",
+    "table",
+    "tbody",
+    "td",
+    "tfoot",
+    "th",
+    "thead",
+    "tr",
+    "u",
+    "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_SCHEMES = {"", "http", "https", "mailto"}
+VOID_TAGS = {"br", "hr", "img"}
+# dropped together with everything inside them
+DROPPED_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript"}
+# their boundaries separate words in the plain text
+BLOCK_TAGS = {
+    "blockquote",
+    "br",
+    "div",
+    "figcaption",
+    "figure",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "li",
+    "p",
+    "pre",
+    "td",
+    "th",
+    "tr",
+}
+
+# browsers ignore whitespace and control characters inside a scheme, "java\nscript:" is still javascript
+IGNORED_URL_CHARACTERS = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def is_safe_url(url):
+    try:
+        scheme = urlsplit(IGNORED_URL_CHARACTERS.sub("", url)).scheme
+    except ValueError:
+        return False
+    return scheme.lower() in ALLOWED_SCHEMES
+
+
+class Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        # allowed tags left open, closed at the end so markup cannot leak out of the content
+        self.open_tags = []
+        self.dropped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth += 1
+            return
+        if self.dropped_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attributes = "".join(
+            ' {}="{}"'.format(name, html.escape(value))
+            for name, value in attrs
+            if name in allowed
+            and value is not None
+            and (name not in URL_ATTRIBUTES or is_safe_url(value))
+        )
+        if tag == "a":
+            attributes += ' rel="nofollow noopener"'
+        self.html.append("<{}{}>".format(tag, attributes))
+
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag not in DROPPED_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth = max(self.dropped_depth - 1, 0)
+            return
+        if self.dropped_depth:
+            return
+
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        # stray closing tags are ignored, tags left open inside this one are closed with it
+        if tag in self.open_tags:
+            while True:
+                open_tag = self.open_tags.pop()
+                self.html.append("</{}>".format(open_tag))
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.dropped_depth:
+            return
+        self.html.append(html.escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append("</{}>".format(self.open_tags.pop()))
+
+
+def sanitize_html(content):
+    # (sanitized html safe to render with |safe, whitespace collapsed plain text for search and excerpts)
+    sanitizer = Sanitizer()
+    sanitizer.feed(content or "")
+    sanitizer.close()
+    return "".join(sanitizer.html), " ".join("".join(sanitizer.text).split())
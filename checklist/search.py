@@ -0,0 +1,463 @@
+# full-text index over published checklists and all items, kept in side tables next to checklist_checklist and checklist_item
+# SQLite - FTS5 virtual table, refer https://www.sqlite.org/fts5.html
+# PostgreSQL - tsvector column with a GIN index, refer https://www.postgresql.org/docs/current/textsearch-tables.html
+# other databases fall back to scanning titles and content with icontains
+import re
+from array import array
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from checklist.cache import LRUCache, bump_version, get_version
+from checklist.models import Checklist, Item
+
+SEARCH_TABLE = "checklist_search"
+# item titles are part of the checklist document for ranking, and indexed on their own to show which items matched
+ITEM_SEARCH_TABLE = "checklist_item_search"
+
+CREATE_SQL = {
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(title, body, items, tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE VIRTUAL TABLE {ITEM_SEARCH_TABLE} USING fts5(title, checklist_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    ],
+    "postgresql": [
+        f"CREATE TABLE {SEARCH_TABLE} (checklist_id integer PRIMARY KEY REFERENCES checklist_checklist (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)",
+        f"CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)",
+        f"CREATE TABLE {ITEM_SEARCH_TABLE} (item_id integer PRIMARY KEY REFERENCES checklist_item (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, checklist_id integer NOT NULL, title text NOT NULL, document tsvector NOT NULL)",
+        f"CREATE INDEX {ITEM_SEARCH_TABLE}_document_idx ON {ITEM_SEARCH_TABLE} USING GIN (document)",
+        f"CREATE INDEX {ITEM_SEARCH_TABLE}_checklist_idx ON {ITEM_SEARCH_TABLE} (checklist_id)",
+    ],
+}
+
+DROP_SQL = {
+    "sqlite": [
+        f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+        f"DROP TABLE IF EXISTS {ITEM_SEARCH_TABLE}",
+    ],
+    "postgresql": [
+        f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+        f"DROP TABLE IF EXISTS {ITEM_SEARCH_TABLE}",
+    ],
+}
+
+# rowid of the FTS5 tables is the checklist / item id
+INSERT_SQL = {
+    "sqlite": f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, items) VALUES (%s, %s, %s, %s)",
+    # 'simple' configuration does not stem, so prefix queries behave like on SQLite
+    "postgresql": (
+        f"INSERT INTO {SEARCH_TABLE} (checklist_id, document) VALUES "
+        "(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+        "|| setweight(to_tsvector('simple', %s), 'C'))"
+    ),
+}
+
+DELETE_SQL = {
+    "sqlite": f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+    "postgresql": f"DELETE FROM {SEARCH_TABLE} WHERE checklist_id = %s",
+}
+
+ITEM_INSERT_SQL = {
+    "sqlite": f"INSERT INTO {ITEM_SEARCH_TABLE} (rowid, checklist_id, title) VALUES (%s, %s, %s)",
+    "postgresql": (
+        f"INSERT INTO {ITEM_SEARCH_TABLE} (item_id, checklist_id, title, document) "
+        "VALUES (%s, %s, %s, to_tsvector('simple', %s))"
+    ),
+}
+
+ITEM_DELETE_SQL = {
+    "sqlite": f"DELETE FROM {ITEM_SEARCH_TABLE} WHERE rowid = %s",
+    "postgresql": f"DELETE FROM {ITEM_SEARCH_TABLE} WHERE item_id = %s",
+}
+
+# matching items of the given checklists; "IN (%s)" is expanded to one placeholder per checklist, "%%s" is the match expression
+ITEM_MATCH_SQL = {
+    "sqlite": (
+        f"SELECT checklist_id, title FROM {ITEM_SEARCH_TABLE} "
+        f"WHERE {ITEM_SEARCH_TABLE} MATCH %%s AND checklist_id IN (%s) ORDER BY rowid"
+    ),
+    "postgresql": (
+        f"SELECT checklist_id, title FROM {ITEM_SEARCH_TABLE} "
+        "WHERE document @@ to_tsquery('simple', %%s) AND checklist_id IN (%s) ORDER BY item_id"
+    ),
+}
+# item titles shown below a search result
+MAX_ITEM_MATCHES = 3
+
+# ranked top-k over the index hits, score = text relevance * upvote boost * recency decay
+# upvote boost grows from 1 towards 2 and is 1.5 at UPVOTE_SATURATION upvotes, recency halves after RECENCY_DAYS
+RANK_SQL = {
+    # bm25() is lower for better matches, a title hit weighs 4 times a content hit and 2 times an item hit
+    "sqlite": (
+        f"SELECT c.id FROM {SEARCH_TABLE} s JOIN checklist_checklist c ON c.id = s.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND c.is_draft = %s AND (%s IS NULL OR c.category_id = %s) "
+        f"ORDER BY -bm25({SEARCH_TABLE}, 4.0, 1.0, 2.0) "
+        "* (1.0 + c.upvote_count / (c.upvote_count + %s)) "
+        "/ (1.0 + (julianday('now') - julianday(c.date_posted)) / %s) DESC, c.id DESC "
+        "LIMIT %s"
+    ),
+    # ts_rank() weighs the title (A) above the content (B) and the items (C)
+    "postgresql": (
+        f"SELECT c.id FROM {SEARCH_TABLE} s JOIN checklist_checklist c ON c.id = s.checklist_id, "
+        "to_tsquery('simple', %s) q "
+        "WHERE s.document @@ q AND c.is_draft = %s AND (%s IS NULL OR c.category_id = %s) "
+        "ORDER BY ts_rank(s.document, q) "
+        "* (1.0 + c.upvote_count / (c.upvote_count + %s)) "
+        "/ (1.0 + EXTRACT(EPOCH FROM (now() - c.date_posted)) / 86400.0 / %s) DESC, c.id DESC "
+        "LIMIT %s"
+    ),
+}
+# hits per category over all matches of a query, not only the ranked top MAX_RESULTS
+FACET_SQL = {
+    "sqlite": (
+        f"SELECT cat.id, cat.name, COUNT(*) FROM {SEARCH_TABLE} s "
+        "JOIN checklist_checklist c ON c.id = s.rowid JOIN checklist_category cat ON cat.id = c.category_id "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND c.is_draft = %s "
+        "GROUP BY cat.id, cat.name ORDER BY COUNT(*) DESC, cat.name"
+    ),
+    "postgresql": (
+        f"SELECT cat.id, cat.name, COUNT(*) FROM {SEARCH_TABLE} s "
+        "JOIN checklist_checklist c ON c.id = s.checklist_id JOIN checklist_category cat ON cat.id = c.category_id "
+        "WHERE s.document @@ to_tsquery('simple', %s) AND c.is_draft = %s "
+        "GROUP BY cat.id, cat.name ORDER BY COUNT(*) DESC, cat.name"
+    ),
+}
+UPVOTE_SATURATION = 10.0
+RECENCY_DAYS = 30.0
+# nobody pages through more results than this
+MAX_RESULTS = 1000
+
+# category facets and ranked ids of recent queries; entries are keyed on the search index version, which every indexed change bumps
+# upvotes do not bump it, so the ttl bounds how long a ranking by old upvote counts is served
+RESULT_CACHE_SIZE = 1000
+RESULT_CACHE_TTL = 300
+SEARCH_VERSION = "search"
+result_cache = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+MATCH_SQL = {
+    "sqlite": f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+    "postgresql": f"SELECT checklist_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+}
+
+
+def is_supported(vendor=None):
+    return (vendor or connection.vendor) in CREATE_SQL
+
+
+def create_search_table(schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_table(schema_editor):
+    for sql in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def get_terms(query):
+    # only word characters reach the match expression, so user input cannot inject FTS5 / tsquery syntax
+    return re.findall(r"\w+", query.lower())
+
+
+def get_match_expression(terms, vendor=None):
+    # every term has to match as a word prefix, so partially typed words still find results
+    vendor = vendor or connection.vendor
+    if vendor == "sqlite":
+        return " AND ".join(f'"{term}"*' for term in terms)
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def get_items_text(items, checklist_ids):
+    # item titles of each checklist as one text; a range lookup instead of "checklist_id__in" stays within SQLite's parameter limit
+    checklist_ids = set(checklist_ids)
+    titles = {}
+    if not checklist_ids:
+        return titles
+
+    item_titles = (
+        items.filter(
+            checklist_id__gte=min(checklist_ids), checklist_id__lte=max(checklist_ids)
+        )
+        .order_by("id")
+        .values_list("checklist_id", "title")
+    )
+    for checklist_id, title in item_titles:
+        if checklist_id in checklist_ids:
+            titles.setdefault(checklist_id, []).append(title)
+
+    return {
+        checklist_id: "\n".join(item_list) for checklist_id, item_list in titles.items()
+    }
+
+
+def index_rows(rows, items=None):
+    # rows of (checklist id, title, plain text content); replaces existing entries of these checklists
+    rows = list(rows)
+    if not is_supported() or not rows:
+        return
+
+    items_text = get_items_text(
+        items if items is not None else Item.objects,
+        [checklist_id for checklist_id, _, _ in rows],
+    )
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            DELETE_SQL[connection.vendor],
+            [(checklist_id,) for checklist_id, _, _ in rows],
+        )
+        cursor.executemany(
+            INSERT_SQL[connection.vendor],
+            [
+                (
+                    checklist_id,
+                    title,
+                    text,
+                    items_text.get(checklist_id, ""),
+                )
+                for checklist_id, title, text in rows
+            ],
+        )
+
+
+def index_item_rows(rows):
+    # rows of (item id, checklist id, title); replaces existing entries of these items
+    rows = list(rows)
+    if not is_supported() or not rows:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            ITEM_DELETE_SQL[connection.vendor], [(item_id,) for item_id, _, _ in rows]
+        )
+        if connection.vendor == "sqlite":
+            params = rows
+        else:
+            params = [
+                (item_id, checklist_id, title, title)
+                for item_id, checklist_id, title in rows
+            ]
+        cursor.executemany(ITEM_INSERT_SQL[connection.vendor], params)
+
+
+def index_checklist(checklist):
+    # only published checklists are searchable
+    if checklist.is_draft:
+        unindex_checklist(checklist.id)
+    else:
+        index_rows([(checklist.id, checklist.title, checklist.content_text)])
+
+
+def unindex_checklist(checklist_id):
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_SQL[connection.vendor], [checklist_id])
+
+
+def index_item(item):
+    index_item_rows([(item.id, item.checklist_id, item.title)])
+    # item titles are part of the checklist's document too
+    index_checklist(item.checklist)
+
+
+def unindex_item(item):
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(ITEM_DELETE_SQL[connection.vendor], [item.id])
+
+    # gone as well when the item was deleted along with its checklist
+    checklist = Checklist.objects.filter(id=item.checklist_id).first()
+    if checklist is not None:
+        index_checklist(checklist)
+
+
+def rebuild_search_index(checklists=None, items=None, batch_size=1000):
+    # for rows written without save(), e.g. by bulk_create in "manage.py seed_scale"; migrations pass their historical managers
+    if not is_supported():
+        return 0
+
+    if checklists is None:
+        checklists = Checklist.objects
+    if items is None:
+        items = Item.objects
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(f"DELETE FROM {ITEM_SEARCH_TABLE}")
+
+    def in_batches(rows):
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    for batch in in_batches(
+        items.order_by("id").values_list("id", "checklist_id", "title")
+    ):
+        index_item_rows(batch)
+
+    total = 0
+    rows = (
+        checklists.filter(is_draft=False)
+        .order_by("id")
+        .values_list("id", "title", "content_text")
+    )
+    for batch in in_batches(rows):
+        index_rows(batch, items)
+        total += len(batch)
+
+    invalidate_search_results()
+
+    return total
+
+
+def search_checklists(checklists, query):
+    # narrow a Checklist queryset down to the checklists matching every word of query
+    terms = get_terms(query)
+    if not terms:
+        return checklists.none()
+
+    if not is_supported():
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term)
+                | Q(content_text__icontains=term)
+                | Q(item__title__icontains=term)
+            )
+        return checklists.filter(condition).distinct()
+
+    return checklists.filter(
+        id__in=RawSQL(MATCH_SQL[connection.vendor], (get_match_expression(terms),))
+    )
+
+
+def rank_checklists(query, category_id=None, limit=MAX_RESULTS):
+    # ids of the best matching published checklists, best first; ranked and cut off in the database
+    terms = get_terms(query)
+    if not terms:
+        return []
+
+    if not is_supported():
+        checklists = Checklist.objects.filter(is_draft=False)
+        if category_id is not None:
+            checklists = checklists.filter(category_id=category_id)
+        return list(
+            search_checklists(checklists, query)
+            .order_by("-upvote_count", "-date_posted", "-id")
+            .values_list("id", flat=True)[:limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            RANK_SQL[connection.vendor],
+            [
+                get_match_expression(terms),
+                False,
+                category_id,
+                category_id,
+                UPVOTE_SATURATION,
+                RECENCY_DAYS,
+                limit,
+            ],
+        )
+        return [checklist_id for checklist_id, in cursor.fetchall()]
+
+
+def count_categories(query):
+    # [(category id, name, hits)] of the checklists matching query, in one aggregate query
+    terms = get_terms(query)
+    if not terms:
+        return []
+
+    if not is_supported():
+        return list(
+            search_checklists(
+                Checklist.objects.filter(is_draft=False, category__isnull=False), query
+            )
+            .values_list("category_id", "category__name")
+            .annotate(hits=Count("id"))
+            .order_by("-hits", "category__name")
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            FACET_SQL[connection.vendor], [get_match_expression(terms), False]
+        )
+        return cursor.fetchall()
+
+
+def get_item_matches(query, checklist_ids, limit=MAX_ITEM_MATCHES):
+    # {checklist id: [titles of its items matching query]} for the checklists of a result page, in one query
+    terms = get_terms(query)
+    checklist_ids = list(checklist_ids)
+    if not terms or not checklist_ids:
+        return {}
+
+    if not is_supported():
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term)
+        rows = (
+            Item.objects.filter(condition, checklist_id__in=checklist_ids)
+            .order_by("id")
+            .values_list("checklist_id", "title")
+        )
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                ITEM_MATCH_SQL[connection.vendor]
+                % ", ".join(["%s"] * len(checklist_ids)),
+                [get_match_expression(terms)] + checklist_ids,
+            )
+            rows = cursor.fetchall()
+
+    matches = {}
+    for checklist_id, title in rows:
+        titles = matches.setdefault(checklist_id, [])
+        if len(titles) < limit:
+            titles.append(title)
+
+    return matches
+
+
+def normalize_query(query):
+    # case-folded and whitespace-collapsed, so "Camping  Trip" and "camping trip" share a cache entry
+    return " ".join(query.casefold().split())
+
+
+class SearchResults:
+    # cache entry of a query; rankings with a category filter are added as they are requested
+    def __init__(self, facets):
+        self.facets = facets
+        self.ids = {}
+
+
+def get_search_results(query, category_id=None):
+    # cached rank_checklists() and count_categories(); returns (ranked ids, facets), every page of a query is sliced from the same ids
+    query = normalize_query(query)
+    key = (get_version(SEARCH_VERSION), query)
+
+    results = result_cache.get(key)
+    if results is None:
+        results = SearchResults(count_categories(query))
+        result_cache.set(key, results)
+
+    checklist_ids = results.ids.get(category_id)
+    if checklist_ids is None:
+        checklist_ids = array("q", rank_checklists(query, category_id))
+        results.ids[category_id] = checklist_ids
+
+    return checklist_ids, results.facets
+
+
+def invalidate_search_results():
+    bump_version(SEARCH_VERSION)
@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context_processors import invalidate_category_list
+from .models import Category, Checklist, Item, Notification
+from .notifications import invalidate_latest_notification_id, publish_notifications
+from .search import (
+    index_checklist,
+    index_item,
+    invalidate_search_results,
+    unindex_checklist,
+    unindex_item,
+)
+from .typeahead import suggestions
+
+# fields the search index depends on
+INDEXED_FIELDS = {"title", "content", "is_draft"}
+ITEM_INDEXED_FIELDS = {"title", "checklist", "checklist_id"}
+
+
+# keep the full-text index, cached search results and the search suggestions in sync with checklists saved or deleted through the ORM
+@receiver(post_save, sender=Checklist)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_checklist(instance)
+    invalidate_search_results()
+    suggestions.update_checklist(instance)
+
+
+@receiver(post_delete, sender=Checklist)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_checklist(instance.id)
+    invalidate_search_results()
+    suggestions.remove_checklist(instance.id)
+
+
+@receiver(post_save, sender=Item)
+def update_item_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not ITEM_INDEXED_FIELDS.intersection(
+        update_fields
+    ):
+        return
+    # ticking an item off saves it with the same title, nothing to reindex and no cached search result to drop
+    indexed_values = instance.get_indexed_values()
+    if getattr(instance, "indexed_values", None) == indexed_values:
+        return
+    index_item(instance)
+    invalidate_search_results()
+    instance.indexed_values = indexed_values
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_from_search_index(sender, instance, **kwargs):
+    unindex_item(instance)
+    invalidate_search_results()
+
+
+# the cached category list of every process and the search suggestions
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    invalidate_category_list()
+    suggestions.update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    invalidate_category_list()
+    suggestions.remove_category(instance.id)
+
+
+# the cached id behind the ETag of the notification poll and the push to connected receivers; rows written by bulk_create and
+# deleted by the dismiss views are taken care of there
+# no delete receiver, it would make Django load and delete notifications one by one instead of with a single DELETE
+@receiver(post_save, sender=Notification)
+def update_latest_notification_id(sender, instance, **kwargs):
+    invalidate_latest_notification_id([instance.toUser_id])
+    publish_notifications([instance.toUser_id], id=instance.id)
@@ -0,0 +1,268 @@
+# server-sent events pushing new notifications to the browser, served by the ASGI application in checklist_project/asgi.py
+# an idle connection costs no request and no query - with the in-process broker one relay per process reads the notifications
+# added since its last look and hands them to the broker, which passes them on to the connections of their receivers; a broker
+# shared between processes is published to by the writers instead, see publish_notifications() in checklist/notifications.py
+import asyncio
+import json
+import logging
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+from django.db.models import Max
+from django.http.cookie import parse_cookie
+
+from checklist.broker import get_broker
+from checklist.context_processors import NOTIF_DROPDOWN_LIMIT
+from checklist.models import Notification
+from checklist.notifications import (
+    get_new_notifications,
+    load_actors,
+    serialize_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/notif/stream/"
+# a comment sent on an idle connection, so proxies do not close it
+KEEPALIVE_SECONDS = 15
+RELAY_INTERVAL_SECONDS = 2
+RELAY_BATCH_SIZE = 500
+# ids are handed out on insert but rows show up on commit, so with concurrent writers (PostgreSQL) a row can appear after rows
+# with higher ids - every look reads the ids this far below the highest one again and skips those relayed before
+RELAY_WINDOW = 1000
+
+
+def database_sync_to_async(func):
+    # ORM calls from async code run in one thread for all of them; connections are dropped the way a request drops them
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=True)
+
+
+@database_sync_to_async
+def get_user_id(headers):
+    # the user of the session cookie, None for guests
+    cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = auth.get_user(SimpleNamespace(session=session))
+    return user.id if user.is_authenticated else None
+
+
+@database_sync_to_async
+def get_missed_messages(user_id, since):
+    # oldest first, like they are pushed
+    return [
+        serialize_notification(notif)
+        for notif in reversed(
+            get_new_notifications(user_id, since, NOTIF_DROPDOWN_LIMIT)
+        )
+    ]
+
+
+@database_sync_to_async
+def get_relay_start():
+    # (highest id, ids within the window below it) - everything there already is counts as relayed
+    max_id = Notification.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+    relayed_ids = set(
+        Notification.objects.filter(id__gt=max_id - RELAY_WINDOW).values_list(
+            "id", flat=True
+        )
+    )
+    return max_id, relayed_ids
+
+
+@database_sync_to_async
+def get_relayed_messages(last_id, relayed_ids, user_ids):
+    # (highest id read, ids relayed within the window below it, [(user id, message), ...]) for the notifications of users in
+    # user_ids which were not relayed before
+    new_rows = []
+    start = max(last_id - RELAY_WINDOW, 0)
+    while True:
+        # primary key range scan, only the rows of the window and the ones added since the last look
+        rows = list(
+            Notification.objects.filter(id__gt=start)
+            .order_by("id")
+            .values_list("id", "toUser_id")[:RELAY_BATCH_SIZE]
+        )
+        new_rows.extend(row for row in rows if row[0] not in relayed_ids)
+        if len(rows) < RELAY_BATCH_SIZE:
+            break
+        start = rows[-1][0]
+
+    if new_rows:
+        last_id = max(last_id, new_rows[-1][0])
+    relayed_ids = {
+        notif_id
+        for notif_id in relayed_ids.union(notif_id for notif_id, _ in new_rows)
+        if notif_id > last_id - RELAY_WINDOW
+    }
+
+    messages = []
+    wanted = [notif_id for notif_id, to_user_id in new_rows if to_user_id in user_ids]
+    for i in range(0, len(wanted), RELAY_BATCH_SIZE):
+        chunk = wanted[i : i + RELAY_BATCH_SIZE]  # noqa: E203
+        notifs = load_actors(
+            list(
+                Notification.objects.filter(id__in=chunk)
+                .select_related("fromUser", "checklist")
+                .order_by("id")
+            )
+        )
+        messages.extend(
+            (notif.toUser_id, serialize_notification(notif)) for notif in notifs
+        )
+    return last_id, relayed_ids, messages
+
+
+class NotificationRelay:
+    # runs on the event loop of the process only while anyone is connected, started by the first connection and stopped by the last
+    def __init__(self):
+        self.task = None
+        self.ready = None
+        self.last_id = 0
+        self.relayed_ids = set()
+
+    async def start(self):
+        # returns once the relay knows where to read from, notifications added later are all relayed
+        if self.task is None or self.task.done():
+            self.ready = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+        await self.ready.wait()
+
+    def stop(self):
+        # a process without connections does not read the database at all
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        broker = get_broker()
+        try:
+            self.last_id, self.relayed_ids = await get_relay_start()
+        finally:
+            self.ready.set()
+
+        while True:
+            await asyncio.sleep(RELAY_INTERVAL_SECONDS)
+            user_ids = broker.subscribed_user_ids()
+            if not user_ids:
+                return
+            try:
+                (
+                    self.last_id,
+                    self.relayed_ids,
+                    messages,
+                ) = await get_relayed_messages(self.last_id, self.relayed_ids, user_ids)
+            except Exception:
+                logger.exception("relaying notifications failed")
+                continue
+            for user_id, message in messages:
+                broker.publish(user_id, message)
+
+
+relay = NotificationRelay()
+
+
+def format_event(message):
+    # the id is sent back by the browser in the Last-Event-ID header when it reconnects
+    return "id: {}\nevent: notification\ndata: {}\n\n".format(
+        message["id"], json.dumps(message)
+    ).encode()
+
+
+def get_since(scope, headers):
+    # the latest notification the client has, from the page or from the last event it got
+    values = parse_qs(scope.get("query_string", b"").decode()).get("since", [])
+    values.append(headers.get(b"last-event-id", b"").decode())
+    since = 0
+    for value in values:
+        try:
+            since = max(since, int(value))
+        except ValueError:
+            pass
+    return since
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def notification_stream(scope, receive, send):
+    # ASGI application for STREAM_PATH
+    headers = dict(scope.get("headers", []))
+    user_id = await get_user_id(headers)
+    if user_id is None:
+        await send({"type": "http.response.start", "status": 403, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # refer https://www.nginx.com/resources/wiki/start/topics/examples/x-accel/#x-accel-buffering
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+
+    broker = get_broker()
+    # subscribed before looking for missed notifications, so none falls in between
+    subscription = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        if not broker.shared:
+            await relay.start()
+        missed_ids = set()
+        for message in await get_missed_messages(user_id, get_since(scope, headers)):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": format_event(message),
+                    "more_body": True,
+                }
+            )
+            missed_ids.add(message["id"])
+
+        while True:
+            received = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {received, disconnected},
+                timeout=KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                received.cancel()
+                return
+            if received in done:
+                message = received.result()
+                # ids do not arrive in order, see RELAY_WINDOW
+                if message["id"] in missed_ids:
+                    continue
+                body = format_event(message)
+            else:
+                received.cancel()
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+        if not broker.shared and not broker.subscribed_user_ids():
+            relay.stop()
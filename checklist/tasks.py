@@ -0,0 +1,35 @@
+# side effects of requests, run in the background by "manage.py run_worker" - see checklist/jobs.py
+from django.contrib.auth.models import User
+
+from checklist.jobs import job
+from checklist.models import Checklist, Item, Notification
+from checklist.search import index_checklist, index_item_rows, invalidate_search_results
+
+
+@job
+def notify(from_user_id, to_user_id, notif_type, checklist_id=None):
+    users = User.objects.in_bulk([from_user_id, to_user_id])
+    checklist = None
+    if checklist_id is not None:
+        checklist = Checklist.objects.filter(id=checklist_id).first()
+    # nothing to tell when a user or the checklist was deleted in the meantime
+    if len(users) < len({from_user_id, to_user_id}) or (
+        checklist_id is not None and checklist is None
+    ):
+        return
+
+    Notification.notify(users[from_user_id], users[to_user_id], notif_type, checklist)
+
+
+@job
+def index_checklist_items(checklist_id):
+    # items written by bulk_create, e.g. copied by save_and_edit, skip the post_save signal keeping the search index current
+    index_item_rows(
+        Item.objects.filter(checklist_id=checklist_id).values_list(
+            "id", "checklist_id", "title"
+        )
+    )
+    checklist = Checklist.objects.filter(id=checklist_id).first()
+    if checklist is not None:
+        index_checklist(checklist)
+    invalidate_search_results()
@@ -1,6 +1,18 @@
-from django.contrib.auth.models import User
+import copy
+from contextlib import contextmanager
 
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from checklist.cache import forget_versions, get_version
+from checklist.context_processors import CATEGORY_VERSION
+from checklist.jobs import run_pending_jobs
 from checklist.models import (
+    FEED_DEFERRED_FIELDS,
     Bookmark,
     Category,
     Checklist,
@@ -9,6 +21,7 @@ from checklist.models import (
     Notification,
     Upvote,
 )
+from checklist.search import SEARCH_VERSION
 
 
 # define helper functions
@@ -37,11 +50,15 @@ def create_bookmark_upvote(user, checklist, if_bookmark):
     if if_bookmark:
         return Bookmark.objects.create(user=user, checklist=checklist)
     else:
+        # keep the denormalized counter in sync, the same way upvote_checklist() does
+        Checklist.objects.filter(id=checklist.id).update(
+            upvote_count=F("upvote_count") + 1
+        )
         return Upvote.objects.create(user=user, checklist=checklist)
 
 
 def create_item(title, checklist, completed=False):
-    return Item.objects.create(title=title, checklist=checklist)
+    return Item.objects.create(title=title, checklist=checklist, completed=completed)
 
 
 def create_comment(checklist, user, body, parent=None):
@@ -50,10 +67,97 @@ def create_comment(checklist, user, body, parent=None):
     )
 
 
+def create_feed_data(viewer, category, count=6):
+    # checklists by different authors, each upvoted and bookmarked by the viewer; the first one also gets items and comment threads
+    checklists = []
+    for i in range(count):
+        author = create_user_if_not_exists("author" + str(i), "12345")
+        checklist = create_checklist(
+            title="list " + str(i),
+            content="content " + str(i),
+            user=author,
+            category=category,
+        )
+        create_bookmark_upvote(user=viewer, checklist=checklist, if_bookmark=True)
+        create_bookmark_upvote(user=viewer, checklist=checklist, if_bookmark=False)
+        checklists.append(checklist)
+
+        create_item(title="item " + str(i), checklist=checklists[0])
+        comment = create_comment(
+            checklist=checklists[0], user=viewer, body="comment " + str(i)
+        )
+        create_comment(
+            checklist=checklists[0], user=author, body="reply", parent=comment
+        )
+
+    return checklists
+
+
 def create_notif(fromUser, toUser, notif_type, checklist=None):
-    return Notification.objects.create(
+    # coalesced into an existing notification of the same kind, the same way the views do it
+    return Notification.notify(
         fromUser=fromUser,
         toUser=toUser,
         notif_type=notif_type,
         checklist=checklist,
     )
+
+
+def run_jobs():
+    # what "manage.py run_worker" would do with the jobs enqueued by a request
+    return run_pending_jobs(worker="test")
+
+
+# for tests counting exact queries: without MEMCACHE_SERVERS the cache lives in a database table, whose version stamp reads
+# would add to a count depending on when the stamps were last read, see checklist/cache.py and CACHES in checklist_project/settings.py
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+# the backend a deployment without MEMCACHE_SERVERS runs with, query budgets are measured against it
+CONFIGURED_CACHES = copy.deepcopy(settings.CACHES)
+
+
+# maximum number of SQL queries a single request to a url may issue, keyed by url name in checklist/urls.py
+# budgets do not depend on the number of rows, so a request above its budget means an N+1 query crept in
+# they include reading the version stamps from the database cache table, which a process does every VERSION_CHECK_SECONDS
+QUERY_BUDGETS = {
+    "checklist-home": 10,
+    "user-checklists": 11,
+    "user-drafts": 9,
+    "bookmarks": 9,
+    "upvotes": 6,
+    "checklist-detail": 14,
+    "search": 11,
+    "category": 10,
+}
+
+
+@contextmanager
+def assert_query_budget(test_case, url_name):
+    with override_settings(CACHES=CONFIGURED_CACHES):
+        # the stamps exist, but this process re-reads every one of them, as it does every VERSION_CHECK_SECONDS
+        for name in (CATEGORY_VERSION, SEARCH_VERSION):
+            get_version(name)
+        forget_versions()
+
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+    test_case.assertLessEqual(
+        len(context),
+        QUERY_BUDGETS[url_name],
+        "%s issued %d queries, over its budget of %d:\n%s"
+        % (
+            url_name,
+            len(context),
+            QUERY_BUDGETS[url_name],
+            "\n".join(query["sql"] for query in context.captured_queries),
+        ),
+    )
+
+
+def assert_feed_fields_deferred(test_case, checklist):
+    # feed cards must not load any full copy of the checklist body
+    deferred = checklist.get_deferred_fields()
+    for field in FEED_DEFERRED_FIELDS:
+        test_case.assertIn(field, deferred)
@@ -0,0 +1,328 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from checklist.models import (
+    Bookmark,
+    Category,
+    Checklist,
+    Comment,
+    Item,
+    Notification,
+    Upvote,
+)
+from checklist.search import search_checklists
+from users.models import Profile
+
+from .helper_methods import (
+    create_bookmark_upvote,
+    create_category_if_not_exists,
+    create_checklist,
+    create_user_if_not_exists,
+)
+
+
+class TestReconcileUpvoteCountsCommand(TestCase):
+    def setUp(self):
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.user2 = create_user_if_not_exists("testuser2", "12345")
+        self.category = create_category_if_not_exists("test_category")
+        self.list1 = create_checklist(
+            title="list 1",
+            content="content 1",
+            user=self.user,
+            category=self.category,
+        )
+        self.list2 = create_checklist(
+            title="list 2",
+            content="content 2",
+            user=self.user,
+            category=self.category,
+        )
+        create_bookmark_upvote(user=self.user2, checklist=self.list1, if_bookmark=False)
+
+    def test_no_drift(self):
+        out = StringIO()
+        call_command("reconcile_upvote_counts", stdout=out)
+        self.assertIn("Reconciled upvote count of 0 checklists", out.getvalue())
+
+    def test_drift(self):
+        # upvotes removed or added without going through upvote_checklist()
+        Upvote.objects.filter(checklist=self.list1).delete()
+        Upvote.objects.create(user=self.user2, checklist=self.list2)
+
+        out = StringIO()
+        call_command("reconcile_upvote_counts", "--batch-size", "1", stdout=out)
+        self.assertIn("Reconciled upvote count of 2 checklists", out.getvalue())
+
+        self.assertEqual(Checklist.objects.get(id=self.list1.id).upvote_count, 0)
+        self.assertEqual(Checklist.objects.get(id=self.list2.id).upvote_count, 1)
+
+    def test_dry_run(self):
+        Upvote.objects.filter(checklist=self.list1).delete()
+
+        out = StringIO()
+        call_command("reconcile_upvote_counts", "--dry-run", stdout=out)
+        self.assertIn("1 checklists have drifted", out.getvalue())
+        self.assertEqual(Checklist.objects.get(id=self.list1.id).upvote_count, 1)
+
+
+class TestRebuildSearchIndexCommand(TestCase):
+    def test_rebuild(self):
+        user = create_user_if_not_exists("testuser", "12345")
+        # bulk_create does not keep the index in sync
+        Checklist.objects.bulk_create(
+            [
+                Checklist(title="list " + str(i), content="content", author=user)
+                for i in range(3)
+            ]
+        )
+        self.assertFalse(search_checklists(Checklist.objects.all(), "list").exists())
+
+        out = StringIO()
+        call_command("rebuild_search_index", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Indexed 3 checklists", out.getvalue())
+        self.assertEqual(search_checklists(Checklist.objects.all(), "list").count(), 3)
+
+
+class TestSeedScaleCommand(TestCase):
+    def seed(self, prefix, seed=1):
+        call_command(
+            "seed_scale",
+            "--seed",
+            str(seed),
+            "--prefix",
+            prefix,
+            "--users",
+            "20",
+            "--categories",
+            "3",
+            "--checklists",
+            "50",
+            "--upvotes",
+            "200",
+            "--bookmarks",
+            "30",
+            "--follows",
+            "30",
+            "--comments",
+            "20",
+            "--notifications",
+            "40",
+            "--batch-size",
+            "7",
+            stdout=StringIO(),
+        )
+
+        return list(
+            Checklist.objects.filter(author__username__startswith=prefix + "_user_")
+            .order_by("id")
+            .values_list("title", "upvote_count", "is_draft")
+        )
+
+    def test_volumes(self):
+        self.seed("a")
+
+        self.assertEqual(
+            User.objects.filter(username__startswith="a_user_").count(), 20
+        )
+        self.assertEqual(
+            Profile.objects.filter(user__username__startswith="a_").count(), 20
+        )
+        self.assertEqual(Category.objects.filter(name__startswith="a_").count(), 3)
+        self.assertEqual(Checklist.objects.count(), 50)
+        self.assertEqual(Upvote.objects.count(), 200)
+        self.assertEqual(Bookmark.objects.count(), 30)
+        self.assertEqual(Comment.objects.filter(parent=None).count(), 20)
+        # notifications are coalesced by (toUser, notif_type, checklist)
+        self.assertLessEqual(Notification.objects.count(), 40)
+        self.assertLessEqual(
+            Notification.objects.aggregate(actions=Sum("actor_count"))["actions"], 40
+        )
+        self.assertEqual(
+            Notification.objects.values("toUser", "notif_type", "checklist")
+            .distinct()
+            .count(),
+            Notification.objects.count(),
+        )
+
+        # denormalized counter matches the generated upvotes
+        out = StringIO()
+        call_command("reconcile_upvote_counts", "--dry-run", stdout=out)
+        self.assertIn("0 checklists have drifted", out.getvalue())
+
+    def test_deterministic(self):
+        self.assertEqual(self.seed("a"), self.seed("b"))
+        self.assertNotEqual(self.seed("c", seed=2), self.seed("d"))
+
+    def test_existing_prefix(self):
+        self.seed("a")
+        self.assertRaises(CommandError, lambda: self.seed("a"))
+
+
+class TestBenchmarkRoutesCommand(TestCase):
+    def setUp(self):
+        call_command(
+            "seed_scale",
+            "--users",
+            "10",
+            "--categories",
+            "2",
+            "--checklists",
+            "20",
+            "--upvotes",
+            "40",
+            "--comments",
+            "10",
+            "--notifications",
+            "20",
+            stdout=StringIO(),
+        )
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.report_path = os.path.join(self.tmp_dir.name, "report.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def benchmark(self, *args):
+        err = StringIO()
+        call_command(
+            "benchmark_routes",
+            "--iterations",
+            "2",
+            "--output",
+            self.report_path,
+            *args,
+            stderr=err,
+        )
+        with open(self.report_path) as fp:
+            return json.load(fp), err.getvalue()
+
+    def test_report(self):
+        counts = (
+            Checklist.objects.count(),
+            Item.objects.count(),
+            Upvote.objects.count(),
+        )
+
+        report, _ = self.benchmark()
+
+        for label in ("anonymous", "logged_in"):
+            result = report["routes"]["checklist-home [" + label + "]"]
+            self.assertEqual(result["status"], 200)
+            self.assertGreater(result["queries"], 0)
+            self.assertGreater(result["peak_memory_kb"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+
+        # login required routes are only rendered for the logged in user
+        self.assertEqual(report["routes"]["bookmarks [anonymous]"]["status"], 302)
+        self.assertEqual(report["routes"]["bookmarks [logged_in]"]["status"], 200)
+        # routes registered in checklist_project/urls.py are covered as well
+        self.assertIn("profile [logged_in]", report["routes"])
+
+        # toggles and deletes were rolled back
+        self.assertEqual(
+            counts,
+            (Checklist.objects.count(), Item.objects.count(), Upvote.objects.count()),
+        )
+
+    def test_baseline(self):
+        report, _ = self.benchmark()
+
+        baseline_path = os.path.join(self.tmp_dir.name, "baseline.json")
+        with open(baseline_path, "w") as fp:
+            json.dump(report, fp)
+        # p95 can only be compared loosely between two runs
+        _, err = self.benchmark("--baseline", baseline_path, "--threshold", "100")
+        self.assertIn("No regressions", err)
+
+        report["routes"]["checklist-home [anonymous]"]["queries"] = 0
+        with open(baseline_path, "w") as fp:
+            json.dump(report, fp)
+        _, err = self.benchmark("--baseline", baseline_path, "--threshold", "100")
+        self.assertIn("REGRESSION checklist-home [anonymous]: queries 0", err)
+
+        self.assertRaises(
+            CommandError,
+            lambda: self.benchmark(
+                "--baseline",
+                baseline_path,
+                "--threshold",
+                "100",
+                "--fail-on-regression",
+            ),
+        )
+
+
+class TestPruneNotificationsCommand(TestCase):
+    def setUp(self):
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.followers = [
+            create_user_if_not_exists("follower" + str(i), "12345") for i in range(5)
+        ]
+        now = timezone.now()
+        # ids in date order, as most notifications are written
+        for days, follower in zip([100, 95, 91, 10, 0], self.followers):
+            Notification.objects.create(
+                fromUser=self.user,
+                toUser=follower,
+                notif_type=Notification.USER_FOLLOW,
+                checklist=None,
+                date_notified=now - timedelta(days=days),
+            )
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command("prune_notifications", *args, stdout=out)
+        return out.getvalue()
+
+    def test_prune(self):
+        out = self.prune("--batch-size", "2")
+
+        self.assertIn("Deleted 3 notifications", out)
+        self.assertEqual(
+            list(Notification.objects.order_by("id").values_list("toUser", flat=True)),
+            [self.followers[3].id, self.followers[4].id],
+        )
+        self.assertIn("Deleted 0 notifications", self.prune())
+
+    def test_ids_out_of_date_order(self):
+        # back-filled, like fan-out and seed_scale write them: old ones after new ones, several for one recipient
+        now = timezone.now()
+        for notif_type, days in [
+            (Notification.UPVOTE, 200),
+            (Notification.CHECKLIST_FOLLOW, 150),
+            (Notification.NEW_CHECKLIST, 1),
+        ]:
+            Notification.objects.create(
+                fromUser=self.user,
+                toUser=self.followers[4],
+                notif_type=notif_type,
+                checklist=None,
+                date_notified=now - timedelta(days=days),
+            )
+
+        self.assertIn("Deleted 5 notifications", self.prune("--batch-size", "2"))
+        self.assertEqual(
+            sorted(Notification.objects.values_list("toUser", "notif_type").order_by()),
+            sorted(
+                [
+                    (self.followers[3].id, Notification.USER_FOLLOW),
+                    (self.followers[4].id, Notification.USER_FOLLOW),
+                    (self.followers[4].id, Notification.NEW_CHECKLIST),
+                ]
+            ),
+        )
+
+    def test_days(self):
+        self.assertIn("Deleted 4 notifications", self.prune("--days", "5"))
+        self.assertEqual(Notification.objects.count(), 1)
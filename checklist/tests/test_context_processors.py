@@ -0,0 +1,183 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from checklist.cache import (
+    VERSION_CHECK_SECONDS,
+    bump_version,
+    forget_versions,
+    get_version,
+)
+from checklist.context_processors import (
+    NOTIF_DROPDOWN_LIMIT,
+    add_variable_to_context,
+    invalidate_category_list,
+)
+
+from .helper_methods import (
+    LOCMEM_CACHES,
+    create_category_if_not_exists,
+    create_checklist,
+    create_notif,
+    create_user_if_not_exists,
+)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestNotificationDropdown(TestCase):
+    def setUp(self):
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.sender = create_user_if_not_exists("sender", "12345")
+        self.category = create_category_if_not_exists("test_category")
+        self.checklist = create_checklist(
+            title="list 1", content="content 1", user=self.user, category=self.category
+        )
+
+    def get_notifications(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return add_variable_to_context(request)["notifications"]
+
+    def test_lazy(self):
+        create_notif(self.sender, self.user, 1, self.checklist)
+
+        with self.assertNumQueries(0):
+            notifications = self.get_notifications(self.user)
+
+        # sender and checklist are joined in
+        with self.assertNumQueries(1):
+            rows = [
+                (notif.fromUser.username, notif.checklist.title)
+                for notif in notifications.latest
+            ]
+            self.assertEqual(notifications.unread_count, 1)
+            self.assertEqual(notifications.hidden_count, 0)
+        self.assertEqual(rows, [("sender", "list 1")])
+
+    def test_recent_actors(self):
+        others = [
+            create_user_if_not_exists("other" + str(i), "12345") for i in range(4)
+        ]
+        for actor in [self.sender] + others:
+            create_notif(actor, self.user, 1, self.checklist)
+        create_notif(self.sender, self.user, 2)
+
+        notifications = self.get_notifications(self.user)
+        # the other recent actors of every notification are looked up in one more query
+        with self.assertNumQueries(2):
+            follows, upvotes = notifications.latest
+        self.assertEqual(follows.actors, [self.sender])
+        self.assertEqual(follows.other_actor_count, 0)
+        self.assertEqual(upvotes.actors, others[:0:-1])
+        self.assertEqual(upvotes.other_actor_count, 2)
+
+    def test_limit(self):
+        notifs = [
+            create_notif(
+                self.sender,
+                self.user,
+                3,
+                create_checklist(
+                    title="list", content="", user=self.user, category=self.category
+                ),
+            )
+            for _ in range(NOTIF_DROPDOWN_LIMIT + 3)
+        ]
+        # notifications of other users are not counted
+        create_notif(self.user, self.sender, 2)
+
+        notifications = self.get_notifications(self.user)
+        self.assertEqual(notifications.latest, notifs[::-1][:NOTIF_DROPDOWN_LIMIT])
+        self.assertEqual(notifications.unread_count, NOTIF_DROPDOWN_LIMIT + 3)
+        self.assertEqual(notifications.hidden_count, 3)
+
+    def test_anonymous(self):
+        notifications = self.get_notifications(AnonymousUser())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.latest, [])
+            self.assertEqual(notifications.unread_count, 0)
+
+    def test_navbar(self):
+        create_notif(self.sender, self.user, 1, self.checklist)
+        self.client.login(username="testuser", password="12345")
+
+        response = self.client.get(reverse("checklist-home"))
+        self.assertContains(
+            response, '<span id="notif-count" class="badge badge-danger">1</span>'
+        )
+        self.assertContains(response, "upvoted your checklist titled")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestCategoryList(TestCase):
+    def setUp(self):
+        # the cached list outlives the rows rolled back after each test
+        invalidate_category_list()
+        self.category = create_category_if_not_exists("test_category")
+
+    def get_category_list(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        return add_variable_to_context(request)["category_list"]
+
+    def test_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.get_category_list()), [self.category])
+        with self.assertNumQueries(0):
+            self.assertEqual(list(self.get_category_list()), [self.category])
+            # not even loaded when unused
+            self.get_category_list()
+
+    def test_invalidated_by_signals(self):
+        list(self.get_category_list())
+
+        other = create_category_if_not_exists("other_category")
+        self.assertEqual(list(self.get_category_list()), [self.category, other])
+
+        self.category.name = "renamed"
+        self.category.save()
+        self.assertEqual(self.get_category_list()[0].name, "renamed")
+
+        other.delete()
+        self.assertEqual(list(self.get_category_list()), [self.category])
+
+
+class TestCacheBackend(TestCase):
+    def test_shared_between_processes(self):
+        # version bumps have to reach every web and worker process
+        self.assertNotIsInstance(caches["default"], LocMemCache)
+
+    def test_version_check_interval(self):
+        create_category_if_not_exists("test_category")
+        invalidate_category_list()
+        forget_versions()
+
+        def render_home():
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(reverse("checklist-home"))
+            return [
+                query["sql"]
+                for query in context.captured_queries
+                if "checklist_cache" in query["sql"]
+            ]
+
+        # the stamp is read once, then trusted for VERSION_CHECK_SECONDS
+        self.assertEqual(len(render_home()), 1)
+        self.assertEqual(render_home(), [])
+
+        later = time.monotonic() + VERSION_CHECK_SECONDS
+        with mock.patch("checklist.cache.time.monotonic", return_value=later):
+            self.assertEqual(len(render_home()), 1)
+
+    def test_bump_seen_at_once(self):
+        version = get_version("test")
+        bump_version("test")
+        self.assertNotEqual(get_version("test"), version)
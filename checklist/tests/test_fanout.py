@@ -0,0 +1,77 @@
+from django.test import TestCase, override_settings
+
+from checklist.fanout import fan_out_checklist
+from checklist.models import Follow, Notification
+
+from .helper_methods import (
+    LOCMEM_CACHES,
+    create_category_if_not_exists,
+    create_checklist,
+    create_user_if_not_exists,
+)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestFanOut(TestCase):
+    def setUp(self):
+        self.author = create_user_if_not_exists("author", "12345")
+        self.category = create_category_if_not_exists("test_category")
+        self.followers = [
+            create_user_if_not_exists("follower" + str(i), "12345") for i in range(7)
+        ]
+        for follower in self.followers:
+            Follow.objects.create(fromUser=follower, toUser=self.author)
+        # follows someone else
+        Follow.objects.create(
+            fromUser=create_user_if_not_exists("other", "12345"),
+            toUser=self.followers[0],
+        )
+
+        self.checklist = create_checklist(
+            title="list 1",
+            content="content 1",
+            user=self.author,
+            category=self.category,
+        )
+
+    def test_fan_out(self):
+        # 3 chunks of followers plus the empty one ending the scan, each written with one insert
+        with self.assertNumQueries(1 + 3 * 2 + 1):
+            self.assertEqual(fan_out_checklist(self.checklist.id, batch_size=3), 7)
+
+        notifs = Notification.objects.filter(notif_type=Notification.NEW_CHECKLIST)
+        self.assertEqual(
+            sorted(notif.toUser_id for notif in notifs),
+            [follower.id for follower in self.followers],
+        )
+        self.assertTrue(
+            all(
+                notif.fromUser_id == self.author.id
+                and notif.checklist_id == self.checklist.id
+                and notif.get_recent_actor_ids() == [self.author.id]
+                for notif in notifs
+            )
+        )
+
+        # running the job again adds nothing
+        fan_out_checklist(self.checklist.id, batch_size=3)
+        self.assertEqual(notifs.count(), 7)
+
+    def test_draft(self):
+        draft = create_checklist(
+            title="list 2",
+            content="content 2",
+            user=self.author,
+            category=self.category,
+            is_draft=True,
+        )
+
+        self.assertEqual(fan_out_checklist(draft.id), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_navbar(self):
+        fan_out_checklist(self.checklist.id)
+
+        self.client.login(username="follower0", password="12345")
+        response = self.client.get("/")
+        self.assertContains(response, "published a new checklist titled")
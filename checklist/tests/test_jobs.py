@@ -0,0 +1,144 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from checklist.jobs import (
+    BACKOFF_SECONDS,
+    LOCK_TIMEOUT_SECONDS,
+    claim_job,
+    heartbeat,
+    job,
+    run_pending_jobs,
+    running,
+)
+from checklist.models import Job
+
+calls = []
+
+
+@job
+def record(value, repeat=1):
+    calls.extend([value] * repeat)
+
+
+@job(max_attempts=2)
+def explode():
+    raise ValueError("boom")
+
+
+@job
+def long_running():
+    # as if it had been running for longer than the lock timeout
+    started = timezone.now() - timedelta(seconds=LOCK_TIMEOUT_SECONDS + 1)
+    Job.objects.update(locked_at=started)
+    running.job.locked_at = started
+    heartbeat()
+    calls.append(claim_job("worker 2"))
+
+
+class TestJobs(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay(self):
+        queued = record.delay("a", repeat=2)
+
+        self.assertEqual(queued.name, "checklist.tests.test_jobs.record")
+        self.assertEqual(
+            json.loads(queued.arguments), {"args": ["a"], "kwargs": {"repeat": 2}}
+        )
+        self.assertEqual(queued.status, Job.QUEUED)
+        # only enqueued
+        self.assertEqual(calls, [])
+
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        self.assertEqual(calls, ["a", "a"])
+        # succeeded jobs are deleted
+        self.assertFalse(Job.objects.exists())
+
+    def test_order(self):
+        record.delay("late")
+        record.delay("early")
+        Job.objects.filter(arguments__contains="early").update(
+            run_at=timezone.now() - timedelta(minutes=1)
+        )
+        record.delay("later")
+        Job.objects.filter(arguments__contains="later").update(
+            run_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        self.assertEqual(run_pending_jobs(), (2, 0))
+        # not due yet
+        self.assertEqual(calls, ["early", "late"])
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+    def test_retry(self):
+        explode.delay()
+
+        before = timezone.now()
+        self.assertEqual(run_pending_jobs(), (0, 1))
+        failed = Job.objects.get()
+        self.assertEqual(failed.status, Job.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("ValueError: boom", failed.last_error)
+        self.assertGreaterEqual(
+            failed.run_at, before + timedelta(seconds=BACKOFF_SECONDS)
+        )
+        # backing off
+        self.assertEqual(run_pending_jobs(), (0, 0))
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_pending_jobs(), (0, 1))
+        failed.refresh_from_db()
+        # out of attempts, kept for inspection
+        self.assertEqual(failed.status, Job.FAILED)
+        self.assertEqual(failed.attempts, 2)
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_pending_jobs(), (0, 0))
+
+    def test_claim(self):
+        record.delay("a")
+
+        claimed = claim_job("worker 1")
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claimed.locked_by, "worker 1")
+        self.assertEqual(claimed.attempts, 1)
+        # a running job is not handed to another worker
+        self.assertIsNone(claim_job("worker 2"))
+
+        # unless its worker seems to have crashed
+        Job.objects.update(
+            locked_at=timezone.now() - timedelta(seconds=LOCK_TIMEOUT_SECONDS + 1)
+        )
+        reclaimed = claim_job("worker 2")
+        self.assertEqual(reclaimed.id, claimed.id)
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_heartbeat(self):
+        long_running.delay()
+
+        self.assertEqual(run_pending_jobs("worker 1"), (1, 0))
+        # not claimed by another worker while it still runs
+        self.assertEqual(calls, [None])
+
+        # outside a worker it does nothing
+        heartbeat()
+
+    def test_run_worker(self):
+        record.delay("a")
+        explode.delay()
+
+        out = StringIO()
+        call_command("run_worker", "--once", stdout=out)
+        self.assertEqual(calls, ["a"])
+        self.assertIn("ran 1 jobs, 1 failed", out.getvalue())
+
+    def test_unknown_job(self):
+        Job.objects.create(name="checklist.tests.test_jobs.missing", max_attempts=1)
+
+        self.assertEqual(run_pending_jobs(), (0, 1))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
@@ -0,0 +1,27 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .helper_methods import create_category_if_not_exists
+
+
+class TestQueryStatsMiddleware(TestCase):
+    def setUp(self):
+        create_category_if_not_exists("test_category")
+
+    @override_settings(QUERY_STATS_ENABLED=True)
+    def test_enabled(self):
+        with self.assertLogs("checklist.middleware", level="INFO") as logs:
+            response = self.client.get(reverse("checklist-home"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response["X-DB-Query-Count"]), 0)
+        self.assertGreaterEqual(float(response["X-DB-Time-Ms"]), 0)
+        self.assertIn("view=checklist-home", logs.output[0])
+        self.assertIn("queries=" + response["X-DB-Query-Count"], logs.output[0])
+
+    @override_settings(QUERY_STATS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("checklist-home"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("X-DB-Query-Count"))
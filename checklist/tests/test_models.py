@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from django.test import TestCase
 
 from checklist.models import (
+    EXCERPT_LENGTH,
     Bookmark,
     Category,
     Checklist,
@@ -50,6 +51,51 @@ class TestChecklistModel(TestCase):
             "/checklist/" + str(TestChecklistModel.user.id) + "/",
         )
 
+    def test_excerpt(self):
+        checklist = Checklist.objects.get(id=TestChecklistModel.checklist.id)
+        self.assertEqual(checklist.excerpt, "Test content")
+
+        checklist.content = (
+            "<p>Pack &amp; <b>go</b></p><ul><li>1</li><li>2</li></ul>"
+            + ("<p>word</p>" * 100)
+        )
+        checklist.save()
+
+        checklist.refresh_from_db()
+        self.assertTrue(checklist.excerpt.startswith("Pack & go 1 2 word word"))
+        self.assertNotIn("<", checklist.excerpt)
+        self.assertEqual(len(checklist.excerpt), EXCERPT_LENGTH)
+
+        # saving an instance loaded without content keeps its excerpt
+        deferred = Checklist.objects.defer("content").get(id=checklist.id)
+        deferred.title = "New title"
+        deferred.save()
+        checklist.refresh_from_db()
+        self.assertTrue(checklist.excerpt.startswith("Pack & go"))
+
+    def test_sanitized_content(self):
+        checklist = Checklist.objects.get(id=TestChecklistModel.checklist.id)
+        checklist.content = (
+            '<p onclick="steal()">Pack <b>light</b><script>alert(1)</script></p>'
+            '<a href="java\nscript:alert(1)">bad</a> <a href="https://x.org">good</a>'
+            "<iframe src='https://x.org'>frame</iframe> <blink>blink"
+        )
+        checklist.save(update_fields=["content"])
+
+        checklist.refresh_from_db()
+        self.assertEqual(
+            checklist.content_html,
+            '<p>Pack <b>light</b></p><a rel="nofollow noopener">bad</a> '
+            '<a href="https://x.org" rel="nofollow noopener">good</a> blink',
+        )
+        self.assertEqual(checklist.content_text, "Pack light bad good blink")
+        self.assertEqual(checklist.excerpt, checklist.content_text)
+
+        # markup left open is closed so it cannot swallow the rest of the page
+        checklist.content = "<ul><li><em>one</li>"
+        checklist.save()
+        self.assertEqual(checklist.content_html, "<ul><li><em>one</em></li></ul>")
+
 
 class TestItemModel(TestCase):
     @classmethod
@@ -199,6 +245,50 @@ class TestNotificationModel(TestCase):
         )
         self.assertTrue(isinstance(notif_obj, Notification))
 
+    def test_notify_coalesced(self):
+        actors = [
+            create_user_if_not_exists(username="actor" + str(i), password="12345")
+            for i in range(5)
+        ]
+        for actor in actors + [actors[3]]:
+            notif = Notification.notify(
+                actor, TestNotificationModel.user1, Notification.UPVOTE, self.checklist
+            )
+
+        self.assertEqual(Notification.objects.count(), 1)
+        notif.refresh_from_db()
+        # a repeated actor among the recent ones is not counted again
+        self.assertEqual(notif.actor_count, 5)
+        self.assertEqual(notif.fromUser, actors[3])
+        self.assertEqual(
+            notif.get_recent_actor_ids(), [actors[3].id, actors[4].id, actors[2].id]
+        )
+
+        # other types, checklists and receivers get their own rows; follows of a user have no checklist
+        Notification.notify(
+            actors[0],
+            TestNotificationModel.user1,
+            Notification.CHECKLIST_FOLLOW,
+            self.checklist,
+        )
+        Notification.notify(
+            actors[0], TestNotificationModel.user1, Notification.USER_FOLLOW
+        )
+        Notification.notify(
+            actors[1], TestNotificationModel.user1, Notification.USER_FOLLOW
+        )
+        Notification.notify(
+            actors[0], TestNotificationModel.user2, Notification.USER_FOLLOW
+        )
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(
+            Notification.objects.get(
+                toUser=TestNotificationModel.user1,
+                notif_type=Notification.USER_FOLLOW,
+            ).actor_count,
+            2,
+        )
+
 
 class TestCommentModel(TestCase):
     @classmethod
@@ -222,3 +312,14 @@ class TestCommentModel(TestCase):
         )
 
         self.assertTrue(isinstance(comment_obj, Comment))
+
+    def test_sanitized_body(self):
+        comment_obj = create_comment(
+            checklist=TestCommentModel.checklist,
+            user=TestCommentModel.user2,
+            body='<p style="color: red">Nice &amp; <img src="x.png" onerror="steal()"></p>',
+        )
+
+        comment_obj.refresh_from_db()
+        self.assertEqual(comment_obj.body_html, '<p>Nice &amp; <img src="x.png"></p>')
+        self.assertEqual(comment_obj.body_text, "Nice &")
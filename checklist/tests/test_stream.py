@@ -0,0 +1,299 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.db import transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+from checklist.broker import InProcessBroker
+from checklist.fanout import fan_out_checklist
+from checklist.models import Follow, Notification
+from checklist.stream import (
+    NotificationRelay,
+    database_sync_to_async,
+    get_relayed_messages,
+    notification_stream,
+)
+
+from .helper_methods import (
+    create_category_if_not_exists,
+    create_checklist,
+    create_notif,
+    create_user_if_not_exists,
+)
+
+
+class TestInProcessBroker(SimpleTestCase):
+    def test_publish(self):
+        broker = InProcessBroker()
+        first = broker.subscribe(1)
+        second = broker.subscribe(1)
+        other = broker.subscribe(2)
+        self.assertEqual(broker.subscribed_user_ids(), {1, 2})
+
+        broker.publish(1, {"id": 5})
+        self.assertEqual(first.queue.get_nowait(), {"id": 5})
+        self.assertEqual(second.queue.get_nowait(), {"id": 5})
+        self.assertTrue(other.queue.empty())
+
+        broker.unsubscribe(first)
+        broker.unsubscribe(other)
+        self.assertEqual(broker.subscribed_user_ids(), {1})
+        # nobody listening
+        broker.publish(2, {"id": 6})
+
+    @mock.patch("checklist.broker.SUBSCRIPTION_QUEUE_SIZE", 2)
+    def test_slow_subscriber(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        for notif_id in range(3):
+            broker.publish(1, {"id": notif_id})
+
+        # the oldest message is dropped
+        self.assertEqual(subscription.queue.get_nowait(), {"id": 1})
+        self.assertEqual(subscription.queue.get_nowait(), {"id": 2})
+
+
+class FakeClient:
+    # the server side of an ASGI HTTP connection; created inside the coroutine run by asyncio.run(), since before Python 3.10 the
+    # events are bound to the event loop current when they are created
+    def __init__(self, headers):
+        self.scope = {"type": "http", "path": "/notif/stream/", "headers": headers}
+        self.messages = []
+        self.received = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.requested = False
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+        self.received.set()
+
+    async def wait_for_events(self, count):
+        while len(self.get_events()) < count:
+            self.received.clear()
+            await asyncio.wait_for(self.received.wait(), 5)
+        return self.get_events()
+
+    def get_events(self):
+        body = b"".join(
+            message.get("body", b"")
+            for message in self.messages
+            if message["type"] == "http.response.body"
+        )
+        return [
+            json.loads(line[len("data: ") :])  # noqa: E203
+            for line in body.decode().splitlines()
+            if line.startswith("data: ")
+        ]
+
+
+# the stream reads the database from another thread, so the data has to be committed
+@mock.patch("checklist.stream.RELAY_INTERVAL_SECONDS", 0.01)
+class TestNotificationStream(TransactionTestCase):
+    def setUp(self):
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.user2 = create_user_if_not_exists("testuser2", "12345")
+        self.follow = create_notif(self.user2, self.user, Notification.USER_FOLLOW)
+
+        # a broker and relay of this test only
+        self.relay = NotificationRelay()
+        patchers = [
+            mock.patch("checklist.broker._broker", None),
+            mock.patch("checklist.stream.relay", self.relay),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_headers(self, username):
+        self.client.login(username=username, password="12345")
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        return [
+            (
+                b"cookie",
+                "{}={}".format(settings.SESSION_COOKIE_NAME, session_key).encode(),
+            )
+        ]
+
+    def test_guest(self):
+        async def run():
+            client = FakeClient([])
+            await notification_stream(client.scope, client.receive, client.send)
+            return client
+
+        client = asyncio.run(run())
+        self.assertEqual(client.messages[0]["status"], 403)
+
+    def test_push(self):
+        headers = self.get_headers("testuser")
+        user3 = create_user_if_not_exists("testuser3", "12345")
+
+        async def run():
+            client = FakeClient(headers)
+            stream = asyncio.ensure_future(
+                notification_stream(client.scope, client.receive, client.send)
+            )
+            # missed by the page
+            (missed,) = await client.wait_for_events(1)
+            self.assertEqual(missed["id"], self.follow.id)
+
+            # coalesced, so it is pushed again under its new id
+            follow = await database_sync_to_async(create_notif)(
+                user3, self.user, Notification.USER_FOLLOW
+            )
+            # not for this user
+            await database_sync_to_async(create_notif)(
+                self.user, self.user2, Notification.USER_FOLLOW
+            )
+            _, pushed = await client.wait_for_events(2)
+            self.assertEqual(pushed["id"], follow.id)
+            self.assertEqual(
+                [actor["username"] for actor in pushed["actors"]],
+                ["testuser3", "testuser2"],
+            )
+
+            client.closed.set()
+            await asyncio.wait_for(stream, 5)
+            # the last connection stops the relay
+            self.assertIsNone(self.relay.task)
+            return client
+
+        client = asyncio.run(run())
+        headers = dict(client.messages[0]["headers"])
+        self.assertEqual(headers[b"content-type"], b"text/event-stream")
+        self.assertTrue(
+            client.messages[1]["body"].startswith(
+                "id: {}\nevent: notification\n".format(self.follow.id).encode()
+            )
+        )
+        self.assertEqual(len(client.get_events()), 2)
+
+    def test_since(self):
+        headers = self.get_headers("testuser") + [
+            (b"last-event-id", str(self.follow.id).encode())
+        ]
+        user3 = create_user_if_not_exists("testuser3", "12345")
+
+        async def run():
+            client = FakeClient(headers)
+            stream = asyncio.ensure_future(
+                notification_stream(client.scope, client.receive, client.send)
+            )
+            follow = await database_sync_to_async(create_notif)(
+                user3, self.user, Notification.USER_FOLLOW
+            )
+            (pushed,) = await client.wait_for_events(1)
+            # nothing from before the last event the client got
+            self.assertEqual(pushed["id"], follow.id)
+            client.closed.set()
+            await asyncio.wait_for(stream, 5)
+
+        asyncio.run(run())
+
+    def test_relayed_messages(self):
+        user3 = create_user_if_not_exists("testuser3", "12345")
+        follow = create_notif(self.user, user3, Notification.USER_FOLLOW)
+
+        with mock.patch("checklist.stream.RELAY_BATCH_SIZE", 1):
+            last_id, relayed_ids, messages = asyncio.run(
+                get_relayed_messages(0, set(), {self.user.id, self.user2.id})
+            )
+        self.assertEqual(last_id, follow.id)
+        self.assertEqual(relayed_ids, {self.follow.id, follow.id})
+        self.assertEqual(
+            [(user_id, message["id"]) for user_id, message in messages],
+            [(self.user.id, self.follow.id)],
+        )
+
+        # nothing new
+        self.assertEqual(
+            asyncio.run(get_relayed_messages(last_id, relayed_ids, {self.user.id})),
+            (last_id, relayed_ids, []),
+        )
+
+    def test_relayed_late_commit(self):
+        # a row with a lower id committed after the relay read a higher one, as concurrent writers on PostgreSQL can do
+        user3 = create_user_if_not_exists("testuser3", "12345")
+        follow = create_notif(user3, self.user2, Notification.USER_FOLLOW)
+
+        last_id, relayed_ids, messages = asyncio.run(
+            get_relayed_messages(follow.id, {follow.id}, {self.user.id})
+        )
+        self.assertEqual(last_id, follow.id)
+        self.assertEqual(relayed_ids, {self.follow.id, follow.id})
+        self.assertEqual(
+            [(user_id, message["id"]) for user_id, message in messages],
+            [(self.user.id, self.follow.id)],
+        )
+
+        # out of the window, relayed ids below it are forgotten
+        with mock.patch("checklist.stream.RELAY_WINDOW", 1):
+            _, relayed_ids, messages = asyncio.run(
+                get_relayed_messages(follow.id, {follow.id}, {self.user.id})
+            )
+        self.assertEqual(relayed_ids, {follow.id})
+        self.assertEqual(messages, [])
+
+
+class SharedBroker(InProcessBroker):
+    # stands in for a broker reaching every process, records what is published to the given users
+    shared = True
+
+    def __init__(self, user_ids):
+        super().__init__()
+        self.user_ids = set(user_ids)
+        self.published = []
+
+    def subscribed_user_ids(self):
+        return self.user_ids
+
+    def publish(self, user_id, message):
+        self.published.append((user_id, message))
+
+
+class TestPublishNotifications(TransactionTestCase):
+    def setUp(self):
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.user2 = create_user_if_not_exists("testuser2", "12345")
+        self.category = create_category_if_not_exists("test_category")
+
+        self.broker = SharedBroker([self.user.id])
+        patcher = mock.patch("checklist.broker._broker", self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_notify(self):
+        with transaction.atomic():
+            follow = create_notif(self.user2, self.user, Notification.USER_FOLLOW)
+            # not before the notification is committed
+            self.assertEqual(self.broker.published, [])
+            # nobody listening for this one
+            create_notif(self.user, self.user2, Notification.USER_FOLLOW)
+
+        ((user_id, message),) = self.broker.published
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(message["id"], follow.id)
+        self.assertEqual(message["actors"][0]["username"], "testuser2")
+
+    def test_fan_out(self):
+        Follow.objects.create(fromUser=self.user, toUser=self.user2)
+        checklist = create_checklist(
+            title="list 1",
+            content="content 1",
+            user=self.user2,
+            category=self.category,
+        )
+
+        fan_out_checklist(checklist.id)
+        ((user_id, message),) = self.broker.published
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(message["type"], Notification.NEW_CHECKLIST)
+        self.assertEqual(message["checklist"]["id"], checklist.id)
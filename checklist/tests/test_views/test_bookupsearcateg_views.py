@@ -1,10 +1,23 @@
-from django.test import TestCase
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import resolve, reverse
+from django.utils import timezone
 
+from checklist.cache import LRUCache, get_version
+from checklist.models import Checklist, Item
+from checklist.search import SEARCH_VERSION, invalidate_search_results, result_cache
 from checklist.tests.helper_methods import (
+    LOCMEM_CACHES,
+    assert_feed_fields_deferred,
+    assert_query_budget,
     create_bookmark_upvote,
     create_category_if_not_exists,
     create_checklist,
+    create_feed_data,
+    create_item,
     create_user_if_not_exists,
 )
 from checklist.views import (
@@ -15,6 +28,7 @@ from checklist.views import (
 )
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestBookmarkChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -50,8 +64,21 @@ class TestBookmarkChecklistListView(TestCase):
         response = self.client.get(reverse("bookmarks"))
         self.assertEqual(response.context["checklist_upvotes"].number, 1)
         self.assertEqual(response.context["checklist_upvotes"][0][0], book1)
+        assert_feed_fields_deferred(
+            self, response.context["checklist_upvotes"][0][0].checklist
+        )
+
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "bookmarks"):
+            response = self.client.get(reverse("bookmarks"))
+        self.assertEqual(response.status_code, 200)
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestUpvoteChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -87,8 +114,21 @@ class TestUpvoteChecklistListView(TestCase):
         response = self.client.get(reverse("upvotes"))
         self.assertEqual(response.context["checklist_upvotes"].number, 1)
         self.assertEqual(response.context["checklist_upvotes"][0][0], upvote1)
+        assert_feed_fields_deferred(
+            self, response.context["checklist_upvotes"][0][0].checklist
+        )
+
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
 
+        with assert_query_budget(self, "upvotes"):
+            response = self.client.get(reverse("upvotes"))
+        self.assertEqual(response.status_code, 200)
 
+
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestSearchChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -121,8 +161,260 @@ class TestSearchChecklistListView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["checklist_upvotes"].number, 1)
         self.assertEqual(response.context["checklist_upvotes"][0][0], self.list1)
+        assert_feed_fields_deferred(self, response.context["checklist_upvotes"][0][0])
+
+    def search(self, query):
+        response = self.client.get(reverse("search"), {"q": query})
+        return [row[0] for row in response.context["checklist_upvotes"]]
+
+    def test_search_index(self):
+        list2 = create_checklist(
+            title="camping trip",
+            content="<p>pack the <b>tent</b></p>",
+            user=self.user,
+            category=self.category,
+        )
+
+        # words of title and plain text content, prefixes of words, all words have to match
+        self.assertEqual(self.search("tent"), [list2])
+        self.assertEqual(self.search("Camp"), [list2])
+        self.assertEqual(self.search("camping tent"), [list2])
+        self.assertEqual(self.search("camping list"), [])
+        # markup is not indexed
+        self.assertEqual(self.search("b"), [])
+        # FTS syntax in the query is ignored
+        self.assertEqual(self.search('"tent"* ('), [list2])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_search_ranking(self):
+        now = timezone.now()
+        # bm25 needs the term to be rare in the corpus
+        for i in range(10):
+            create_checklist(
+                title="other " + str(i),
+                content="<p>other</p>",
+                user=self.user,
+                category=self.category,
+            )
+        content_hit = create_checklist(
+            title="list a",
+            content="<p>tent</p>",
+            user=self.user,
+            category=self.category,
+        )
+        title_hit = create_checklist(
+            title="tent",
+            content="<p>list b</p>",
+            user=self.user,
+            category=self.category,
+        )
+        self.assertEqual(self.search("tent"), [title_hit, content_hit])
+
+        # upvotes lift a checklist above an equally relevant one
+        title_hit2 = create_checklist(
+            title="tent",
+            content="<p>list c</p>",
+            user=self.user,
+            category=self.category,
+        )
+        Checklist.objects.filter(id=title_hit2.id).update(upvote_count=5)
+        self.assertEqual(self.search("tent"), [title_hit2, title_hit, content_hit])
+
+        # and older checklists sink
+        Checklist.objects.filter(id=title_hit2.id).update(
+            date_posted=now - timedelta(days=365)
+        )
+        # update() bypasses the signals which invalidate cached results
+        invalidate_search_results()
+        self.assertEqual(self.search("tent"), [title_hit, content_hit, title_hit2])
+
+    def test_result_cache(self):
+        # two pages of results
+        lists = [
+            create_checklist(
+                title="list " + str(i),
+                content="content",
+                user=self.user,
+                category=self.category,
+            )
+            for i in range(5)
+        ]
+        result_cache.clear()
+
+        self.assertEqual(len(self.search("List")), 5)
+        # normalized query of the same search, and another page of it
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.search("  LIST ")), 5)
+            response = self.client.get(reverse("search"), {"q": "list", "page": 2})
+            self.assertEqual(response.context["checklist_upvotes"].number, 2)
+        self.assertFalse(
+            [query for query in queries if "checklist_search" in query["sql"]]
+        )
+        self.assertEqual(result_cache.stats()["hits"], 2)
+        self.assertEqual(result_cache.stats()["misses"], 1)
+
+        # publishing a checklist invalidates cached results
+        list2 = create_checklist(
+            title="list 2", content="content", user=self.user, category=self.category
+        )
+        self.assertEqual(self.search("list")[0], list2)
+
+        list2.is_draft = True
+        list2.save()
+        self.assertEqual(self.search("list")[0], lists[-1])
+
+    def test_result_cache_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        # "b" was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(
+            cache.stats(),
+            {
+                "size": 2,
+                "max_size": 2,
+                "hits": 3,
+                "misses": 1,
+                "evictions": 1,
+                "hit_rate": 0.75,
+            },
+        )
 
+    def test_result_cache_stats(self):
+        response = self.client.get(reverse("search-cache-stats"))
+        self.assertEqual(response.status_code, 302)
 
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse("search-cache-stats"))
+        self.assertIn("hit_rate", response.json()["results"])
+
+    def test_item_search(self):
+        list2 = create_checklist(
+            title="camping trip",
+            content="<p>things to take</p>",
+            user=self.user,
+            category=self.category,
+        )
+        for title in ("sleeping bag", "tent pegs", "tent", "tent poles", "tent light"):
+            create_item(title, list2)
+        create_item("tent", self.list1)
+
+        response = self.client.get(reverse("search"), {"q": "tent"})
+        checklists = [row[0] for row in response.context["checklist_upvotes"]]
+        self.assertEqual(set(checklists), {self.list1, list2})
+        # matching items of each result, at most MAX_ITEM_MATCHES of them
+        list2_result = checklists[checklists.index(list2)]
+        self.assertEqual(
+            list2_result.matching_items, ["tent pegs", "tent", "tent poles"]
+        )
+        self.assertContains(response, "tent pegs")
+        self.assertNotContains(response, "sleeping bag")
+
+        # renamed and deleted items are no longer found
+        item = Item.objects.get(checklist=self.list1)
+        item.title = "stove"
+        item.save()
+        self.assertEqual(self.search("tent"), [list2])
+        self.assertEqual(self.search("stove"), [self.list1])
+        item.delete()
+        self.assertEqual(self.search("stove"), [])
+
+    def test_category_facets(self):
+        category2 = create_category_if_not_exists("other_category")
+        list2 = create_checklist(
+            title="list 2", content="content", user=self.user, category=category2
+        )
+        list3 = create_checklist(
+            title="list 3", content="content", user=self.user, category=category2
+        )
+        create_checklist(
+            title="list 4", content="content", user=self.user, category=None
+        )
+        create_checklist(
+            title="other", content="content", user=self.user, category=self.category
+        )
+
+        response = self.client.get(reverse("search"), {"q": "list"})
+        self.assertEqual(
+            [
+                (facet["name"], facet["count"])
+                for facet in response.context["category_facets"]
+            ],
+            [("other_category", 2), ("test_category", 1)],
+        )
+        self.assertContains(response, "other_category (2)")
+
+        response = self.client.get(
+            reverse("search"), {"q": "list", "category": category2.id}
+        )
+        self.assertEqual(
+            {row[0] for row in response.context["checklist_upvotes"]}, {list2, list3}
+        )
+        # facets still count every category, cached with the unfiltered results
+        self.assertEqual(len(response.context["category_facets"]), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("search"), {"q": "LIST", "category": category2.id})
+        self.assertFalse(
+            [query for query in queries if "checklist_search" in query["sql"]]
+        )
+
+        # an invalid category shows all results
+        response = self.client.get(reverse("search"), {"q": "list", "category": "x"})
+        self.assertEqual(len(response.context["checklist_upvotes"]), 4)
+
+    def test_search_index_sync(self):
+        self.list1.title = "renamed"
+        self.list1.save()
+        self.assertEqual(self.search("list"), [])
+        self.assertEqual(self.search("renamed"), [self.list1])
+
+        self.list1.is_draft = True
+        self.list1.save()
+        self.assertEqual(self.search("renamed"), [])
+
+        self.list1.is_draft = False
+        self.list1.save()
+        self.assertEqual(self.search("renamed"), [self.list1])
+
+        self.list1.delete()
+        self.assertEqual(self.search("renamed"), [])
+
+    def test_item_index_sync(self):
+        item = create_item(title="tent", checklist=self.list1)
+        item = Item.objects.get(id=item.id)
+        version = get_version(SEARCH_VERSION)
+
+        # ticked off, nothing indexed changes
+        item.completed = True
+        item.save()
+        Item.objects.get(id=item.id).save(update_fields=["completed"])
+        self.assertEqual(get_version(SEARCH_VERSION), version)
+
+        item.title = "stove"
+        item.save()
+        self.assertNotEqual(get_version(SEARCH_VERSION), version)
+        self.assertEqual(self.search("tent"), [])
+        self.assertEqual(self.search("stove"), [self.list1])
+
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "search"):
+            response = self.client.get(reverse("search"), {"q": "list"})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestCategoryChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -155,3 +447,13 @@ class TestCategoryChecklistListView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["checklist_upvotes"].number, 1)
         self.assertEqual(response.context["checklist_upvotes"][0][0], list1)
+        assert_feed_fields_deferred(self, response.context["checklist_upvotes"][0][0])
+
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "category"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
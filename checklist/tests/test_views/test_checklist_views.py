@@ -1,10 +1,18 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import resolve, reverse
 
+from checklist.models import Follow, Notification
 from checklist.tests.helper_methods import (
+    LOCMEM_CACHES,
+    assert_feed_fields_deferred,
+    assert_query_budget,
+    create_bookmark_upvote,
     create_category_if_not_exists,
     create_checklist,
+    create_comment,
+    create_feed_data,
     create_user_if_not_exists,
+    run_jobs,
 )
 from checklist.views import (
     ChecklistCreateView,
@@ -18,6 +26,7 @@ from checklist.views import (
 
 
 # test listviews and detailviews
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -68,11 +77,142 @@ class TestChecklistListView(TestCase):
         self.assertEqual(response.context["checklist_upvotes"][0][0], list2)
         self.assertEqual(response.context["checklist_upvotes"][1][0], list1)
 
+    def test_excerpt(self):
+        create_checklist(
+            title="list 1",
+            content="<p>hello <b>world</b></p>",
+            user=self.user,
+            category=self.category,
+        )
+
+        response = self.client.get(reverse("checklist-home"))
+        self.assertContains(response, "hello world")
+        self.assertNotContains(response, "<b>world</b>")
+        # no copy of the full body is loaded for feed cards
+        checklist = response.context["checklist_upvotes"][0][0]
+        assert_feed_fields_deferred(self, checklist)
+
+    def test_second_page(self):
+        lists = [
+            create_checklist(
+                title="list " + str(i),
+                content="content " + str(i),
+                user=self.user,
+                category=self.category,
+            )
+            for i in range(6)
+        ]
+
+        response = self.client.get(reverse("checklist-home"), {"page": 2})
+        self.assertEqual(response.context["checklist_upvotes"].number, 2)
+        self.assertEqual(response.context["checklist_upvotes"].paginator.count, 6)
+        self.assertEqual(
+            list(response.context["checklist_upvotes"]), [(lists[0], 0, True, True)]
+        )
+
+    def test_cursor_pages(self):
+        lists = [
+            create_checklist(
+                title="list " + str(i),
+                content="content " + str(i),
+                user=self.user,
+                category=self.category,
+            )
+            for i in range(7)
+        ]
+
+        response = self.client.get(reverse("checklist-home"), {"cursor": ""})
+        first_page = response.context["checklist_upvotes"]
+        self.assertTrue(response.context["is_cursor_paginated"])
+        self.assertFalse(first_page.has_previous())
+        self.assertEqual([row[0] for row in first_page], lists[:1:-1])
+
+        response = self.client.get(
+            reverse("checklist-home"), {"cursor": first_page.next_cursor}
+        )
+        second_page = response.context["checklist_upvotes"]
+        self.assertFalse(second_page.has_next())
+        self.assertEqual([row[0] for row in second_page], lists[1::-1])
+
+        response = self.client.get(
+            reverse("checklist-home"), {"cursor": second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [row[0] for row in response.context["checklist_upvotes"]], lists[:1:-1]
+        )
+        self.assertFalse(response.context["checklist_upvotes"].has_previous())
+
+    def test_cursor_tampered(self):
+        list1 = create_checklist(
+            title="list 1",
+            content="content 1",
+            user=self.user,
+            category=self.category,
+        )
+
+        response = self.client.get(reverse("checklist-home"), {"cursor": "abc"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["checklist_upvotes"][0][0], list1)
+
+    def test_num_queries(self):
+        # authors, profiles and categories of a full page must not be fetched one query per row
+        for i in range(6):
+            create_checklist(
+                title="list " + str(i),
+                content="content " + str(i),
+                user=create_user_if_not_exists("user" + str(i), "12345"),
+                category=self.category,
+            )
+
+        # feed count, feed page, categories - ListView does not paginate the whole table itself
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("checklist-home"))
+        self.assertEqual(len(response.context["checklist_upvotes"]), 5)
+
+        # + session, user, upvoted/bookmarked/followed ids, notifications; categories are cached by the first request
+        self.client.login(username="testuser", password="12345")
+        with self.assertNumQueries(8):
+            self.client.get(reverse("checklist-home"))
+
+    def test_upvote_bookmark_flags(self):
+        other_user = create_user_if_not_exists("otheruser", "12345")
+        list1 = create_checklist(
+            title="list 1",
+            content="content 1",
+            user=self.user,
+            category=self.category,
+        )
+        list2 = create_checklist(
+            title="list 2",
+            content="content 2",
+            user=self.user,
+            category=self.category,
+        )
+        create_bookmark_upvote(user=other_user, checklist=list1, if_bookmark=False)
+        create_bookmark_upvote(user=other_user, checklist=list1, if_bookmark=True)
+
+        self.client.login(username="otheruser", password="12345")
+        response = self.client.get(reverse("checklist-home"))
+        self.assertEqual(
+            list(response.context["checklist_upvotes"]),
+            [(list2, 0, False, False), (list1, 1, True, True)],
+        )
+
     # https://stackoverflow.com/a/9493533/6543250 - teardown not extremely useful for database flushing since that is handled by django.test.TestCase
     def tearDown(self):
         self.user.delete()
 
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "checklist-home"):
+            response = self.client.get(reverse("checklist-home"))
+        self.assertEqual(response.status_code, 200)
+
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestUserChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -131,7 +271,19 @@ class TestUserChecklistListView(TestCase):
         self.assertEqual(response.context["checklist_upvotes"][0][0], list2)
         self.assertEqual(response.context["checklist_upvotes"][1][0], list1)
 
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
 
+        with assert_query_budget(self, "user-checklists"):
+            response = self.client.get(
+                reverse("user-checklists", kwargs={"username": "author0"})
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestUserDraftChecklistListView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -210,8 +362,26 @@ class TestUserDraftChecklistListView(TestCase):
         self.assertEqual(response.context["checklist_upvotes"][0][0], list2)
         self.assertEqual(response.context["checklist_upvotes"][1][0], list1)
 
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        create_feed_data(viewer, self.category)
+        for i in range(5):
+            create_checklist(
+                title="draft " + str(i),
+                content="content " + str(i),
+                user=viewer,
+                category=self.category,
+                is_draft=True,
+            )
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "user-drafts"):
+            response = self.client.get(reverse("user-drafts"))
+        self.assertEqual(response.status_code, 200)
+
 
 # test checklist CRUD views
+@override_settings(CACHES=LOCMEM_CACHES)
 class TestChecklistDetailView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -237,6 +407,44 @@ class TestChecklistDetailView(TestCase):
         response = self.client.get(reverse("checklist-detail", kwargs={"pk": 1}))
         self.assertEqual(response.context["checklist"].title, "list 1")
 
+    def test_sanitized_content(self):
+        self.list1.content = "<p>safe <b>bold</b></p><script>alert(1)</script>"
+        self.list1.save()
+        commenter = create_user_if_not_exists("otheruser", "12345")
+        create_comment(
+            checklist=self.list1,
+            user=commenter,
+            body='<p><a href="javascript:alert(1)">reply</a></p>',
+        )
+
+        response = self.client.get(reverse("checklist-detail", kwargs={"pk": 1}))
+        self.assertContains(response, "<p>safe <b>bold</b></p>")
+        self.assertContains(response, '<a rel="nofollow noopener">reply</a>')
+        self.assertNotContains(response, "alert(1)")
+        # raw rich text is not loaded to render the page
+        self.assertIn("content", response.context["checklist"].get_deferred_fields())
+
+    def test_viewer_flags(self):
+        other_user = create_user_if_not_exists("otheruser", "12345")
+        create_bookmark_upvote(user=other_user, checklist=self.list1, if_bookmark=True)
+
+        self.client.login(username="otheruser", password="12345")
+        response = self.client.get(reverse("checklist-detail", kwargs={"pk": 1}))
+        self.assertFalse(response.context["if_upvoted"])
+        self.assertTrue(response.context["if_bookmarked"])
+        self.assertFalse(response.context["if_followed"])
+
+    def test_query_budget(self):
+        viewer = create_user_if_not_exists("viewer", "12345")
+        checklists = create_feed_data(viewer, self.category)
+        self.client.login(username="viewer", password="12345")
+
+        with assert_query_budget(self, "checklist-detail"):
+            response = self.client.get(
+                reverse("checklist-detail", kwargs={"pk": checklists[0].id})
+            )
+        self.assertEqual(response.status_code, 200)
+
 
 class TestChecklistCreateView(TestCase):
     def setUp(self):
@@ -328,6 +536,47 @@ class TestChecklistUpdateView(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
+    def test_publish_fan_out(self):
+        follower = create_user_if_not_exists("follower", "12345")
+        Follow.objects.create(fromUser=follower, toUser=self.user)
+        draft = create_checklist(
+            title="draft",
+            content="content",
+            user=self.user,
+            category=self.category,
+            is_draft=True,
+        )
+        self.client.login(username="testuser", password="12345")
+
+        def update(is_draft):
+            list_data = {
+                "title": "draft",
+                "content": "content",
+                "category": self.category.id,
+            }
+            if is_draft:
+                list_data["is_draft"] = "on"
+            response = self.client.post(
+                reverse("checklist-update", kwargs={"pk": draft.id}), data=list_data
+            )
+            self.assertEqual(response.status_code, 302)
+
+        # saving the draft tells nobody
+        update(is_draft=True)
+        self.assertEqual(run_jobs(), (0, 0))
+
+        # publishing it from the form tells the followers, in the background
+        update(is_draft=False)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(run_jobs(), (1, 0))
+        notif = Notification.objects.get()
+        self.assertEqual(notif.toUser, follower)
+        self.assertEqual(notif.notif_type, Notification.NEW_CHECKLIST)
+
+        # editing the published checklist tells nobody again
+        update(is_draft=False)
+        self.assertEqual(run_jobs(), (0, 0))
+
 
 class TestChecklistDeleteView(TestCase):
     def setUp(self):
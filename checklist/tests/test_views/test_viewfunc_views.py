@@ -1,14 +1,23 @@
+import threading
+from unittest import mock
+
 from django.contrib.messages import get_messages
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import resolve, reverse
 
+from checklist.models import Checklist, Follow, Notification
+from checklist.search import search_checklists
 from checklist.tests.helper_methods import (
+    LOCMEM_CACHES,
     create_category_if_not_exists,
     create_checklist,
     create_item,
     create_notif,
     create_user_if_not_exists,
+    run_jobs,
 )
+from checklist.typeahead import suggestions
 
 
 # test view functions
@@ -22,6 +31,152 @@ class TestAboutView(TestCase):
         self.assertTemplateUsed(response, "checklist/about.html")
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestSearchSuggestView(TestCase):
+    def setUp(self):
+        # the index lives for the whole process, load it from this test's data
+        suggestions.reset()
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.category = create_category_if_not_exists("travel")
+        self.list1 = create_checklist(
+            title="Camping trip",
+            content="content 1",
+            user=self.user,
+            category=self.category,
+        )
+        self.list2 = create_checklist(
+            title="Trip to Paris",
+            content="content 2",
+            user=self.user,
+            category=self.category,
+        )
+        Checklist.objects.filter(id=self.list2.id).update(upvote_count=3)
+
+    def tearDown(self):
+        suggestions.reset()
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse("search-suggest"), {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_view_url(self):
+        url = resolve("/search/suggest/")
+        self.assertEqual(url.func.__name__, "search_suggest")
+
+    def test_suggest(self):
+        data = self.suggest("TRI")
+
+        # word prefixes match anywhere in the title, most upvoted first
+        self.assertEqual(
+            [checklist["title"] for checklist in data["checklists"]],
+            ["Trip to Paris", "Camping trip"],
+        )
+        self.assertEqual(
+            data["checklists"][0]["url"],
+            reverse("checklist-detail", kwargs={"pk": self.list2.id}),
+        )
+        self.assertEqual(data["categories"], [])
+
+        self.assertEqual(self.suggest("trav")["categories"][0]["name"], "travel")
+        self.assertEqual(len(self.suggest("tri", limit=1)["checklists"]), 1)
+        self.assertEqual(self.suggest("  ")["checklists"], [])
+
+    def test_several_words(self):
+        def titles(query):
+            return [
+                checklist["title"] for checklist in self.suggest(query)["checklists"]
+            ]
+
+        self.assertEqual(titles("trip to pa"), ["Trip to Paris"])
+        self.assertEqual(titles("camping tr"), ["Camping trip"])
+        # words have to follow each other
+        self.assertEqual(titles("trip paris"), [])
+        self.assertEqual(titles("tri to"), [])
+
+    def test_one_key_per_word(self):
+        self.suggest("tri")
+        # "trip" is stored once for both titles
+        keys = suggestions.checklists.keys
+        self.assertEqual(keys, ["camping", "paris", "to", "trip", "trip"])
+        self.assertIs(keys[3], keys[4])
+
+    def test_no_queries(self):
+        self.suggest("tri")
+
+        with self.assertNumQueries(0):
+            self.suggest("camp")
+
+    def test_incremental_update(self):
+        self.suggest("tri")
+
+        self.list1.title = "Beach holiday"
+        self.list1.save()
+        create_checklist(
+            title="Tripod setup",
+            content="content",
+            user=self.user,
+            category=self.category,
+            is_draft=True,
+        )
+        create_category_if_not_exists("trips")
+
+        data = self.suggest("tri")
+        self.assertEqual(
+            [checklist["title"] for checklist in data["checklists"]],
+            ["Trip to Paris"],
+        )
+        self.assertEqual(self.suggest("beach")["checklists"][0]["id"], self.list1.id)
+        self.assertEqual(data["categories"][0]["name"], "trips")
+
+        self.list2.delete()
+        self.assertEqual(self.suggest("tri")["checklists"], [])
+
+    def test_ranked_over_all_matches(self):
+        # many matches sorting before the best scored one
+        Checklist.objects.bulk_create(
+            Checklist(title="Trip aa " + str(i), content="", author=self.user)
+            for i in range(300)
+        )
+
+        for query in ["t", "trip", "trip to"]:
+            titles = [
+                checklist["title"] for checklist in self.suggest(query)["checklists"]
+            ]
+            self.assertEqual(titles[0], "Trip to Paris")
+        self.assertEqual(len(self.suggest("t", limit=10)["checklists"]), 10)
+
+        Checklist.objects.filter(id=self.list2.id).update(upvote_count=0)
+        self.list1.upvote_count = 5
+        self.list1.save()
+        self.assertEqual(self.suggest("t")["checklists"][0]["title"], "Camping trip")
+
+    def test_limit_bounds(self):
+        self.assertEqual(len(self.suggest("tri", limit=-5)["checklists"]), 1)
+        self.assertEqual(len(self.suggest("tri", limit=0)["checklists"]), 1)
+        self.assertEqual(len(self.suggest("tri", limit=100)["checklists"]), 2)
+        self.assertEqual(len(self.suggest("tri", limit="x")["checklists"]), 2)
+
+    def test_warm_up(self):
+        # the background thread cannot see this test's transaction, so the load itself is stubbed
+        loading = threading.Event()
+        with mock.patch.object(
+            suggestions, "load", side_effect=lambda: loading.wait(5)
+        ) as load:
+            suggestions.warm_up()
+            loader = suggestions.loader
+            suggestions.warm_up()
+            self.assertIs(suggestions.loader, loader)
+
+            # a keystroke does not wait for the load
+            with self.assertNumQueries(0):
+                self.assertEqual(self.suggest("tri")["checklists"], [])
+
+            loading.set()
+            loader.join(5)
+        load.assert_called_once_with()
+
+
 class TestUpvoteChecklistView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
@@ -89,6 +244,38 @@ class TestUpvoteChecklistView(TestCase):
         self.assertEqual(str(messages[1]), "Upvote retracted!")
         self.assertRedirects(response, "/", status_code=302)
 
+    def test_upvote_count(self):
+        self.client.login(username="testuser2", password="12345")
+
+        self.client.get(reverse("checklist-upvote", kwargs={"checklist_id": 1}))
+        self.list1.refresh_from_db()
+        self.assertEqual(self.list1.upvote_count, 1)
+
+        self.client.get(reverse("checklist-upvote", kwargs={"checklist_id": 1}))
+        self.list1.refresh_from_db()
+        self.assertEqual(self.list1.upvote_count, 0)
+
+    def test_notifications_coalesced(self):
+        for username in ["testuser2", "testuser3", "testuser4", "testuser5"]:
+            create_user_if_not_exists(username, "12345")
+            self.client.login(username=username, password="12345")
+            self.client.get(reverse("checklist-upvote", kwargs={"checklist_id": 1}))
+
+        # written in the background
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(run_jobs(), (4, 0))
+
+        # one row for the author, however many upvotes
+        notif = Notification.objects.get()
+        self.assertEqual(notif.toUser, self.user)
+        self.assertEqual(notif.fromUser.username, "testuser5")
+        self.assertEqual(notif.actor_count, 4)
+
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get(reverse("checklist-home"))
+        self.assertContains(response, ">testuser5</a>, <a")
+        self.assertContains(response, ">testuser3</a> and 1 other\n")
+
 
 class TestBookmarkChecklistView(TestCase):
     def setUp(self):
@@ -310,6 +497,22 @@ class TestPublishChecklistView(TestCase):
         )
         self.assertRedirects(response, "/", status_code=302)
 
+    def test_publish_fan_out(self):
+        Follow.objects.create(fromUser=self.user2, toUser=self.user)
+        self.client.login(username="testuser", password="12345")
+        self.client.get(reverse("checklist-publish", kwargs={"checklist_id": 1}))
+
+        # followers are told in the background
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(run_jobs(), (1, 0))
+        notif = Notification.objects.get()
+        self.assertEqual(notif.toUser, self.user2)
+        self.assertEqual(notif.notif_type, Notification.NEW_CHECKLIST)
+
+        # publishing again tells nobody
+        self.client.get(reverse("checklist-publish", kwargs={"checklist_id": 1}))
+        self.assertEqual(run_jobs(), (0, 0))
+
 
 class TestFollowUserView(TestCase):
     def setUp(self):
@@ -429,6 +632,23 @@ class TestSaveAndEditView(TestCase):
         )
         self.assertRedirects(response, "/checklist/2/", status_code=302)
 
+    def test_save_and_edit_items(self):
+        create_item(title="item 1", checklist=self.list1)
+        create_item(title="item 2", checklist=self.list1, completed=True)
+        self.client.login(username="testuser2", password="12345")
+        self.client.get(reverse("checklist-save", kwargs={"checklist_id": 1}))
+
+        # already there when the copy is shown
+        copy = Checklist.objects.get(id=2)
+        self.assertEqual(
+            list(copy.item_set.order_by("id").values_list("title", "completed")),
+            [("item 1", False), ("item 2", True)],
+        )
+        # indexed in the background, then searchable by the copied items; the original is a draft
+        self.assertEqual(list(search_checklists(Checklist.objects, "item")), [])
+        self.assertEqual(run_jobs(), (1, 0))
+        self.assertEqual(list(search_checklists(Checklist.objects, "item")), [copy])
+
     def test_save_and_edit_again(self):
         self.client.login(username="testuser2", password="12345")
         response = self.client.get(
@@ -490,6 +710,182 @@ class TestDismissNotifView(TestCase):
         self.assertRedirects(response, "/", status_code=302)
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestDismissNotifsView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.user2 = create_user_if_not_exists("testuser2", "12345")
+        self.category = create_category_if_not_exists("test_category")
+        self.list1 = create_checklist(
+            title="list 1", content="content 1", user=self.user, category=self.category
+        )
+
+        self.follow = create_notif(self.user2, self.user, Notification.USER_FOLLOW)
+        self.upvote = create_notif(
+            self.user2, self.user, Notification.UPVOTE, checklist=self.list1
+        )
+        self.other = create_notif(self.user, self.user2, Notification.USER_FOLLOW)
+        self.client.login(username="testuser", password="12345")
+
+    def test_view_url(self):
+        url = resolve("/notif/dismiss/")
+        self.assertEqual(url.func.__name__, "dismiss_notifs")
+
+    def test_view_guest(self):
+        self.client.logout()
+        response = self.client.post(reverse("dismiss-notifs"), {"all": "1"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_get(self):
+        response = self.client.get(reverse("dismiss-notifs"))
+        self.assertEqual(response.status_code, 405)
+
+    def test_dismiss_selected(self):
+        # a single DELETE after reading the session and the user
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse("dismiss-notifs"),
+                {"ids": [self.follow.id, self.other.id, "x", "²"]},
+                HTTP_REFERER="/checklist/{}/".format(self.list1.id),
+            )
+
+        self.assertRedirects(response, "/checklist/{}/".format(self.list1.id))
+        # notifications of other users are left alone
+        self.assertQuerysetEqual(
+            Notification.objects.order_by("id"),
+            [repr(self.upvote), repr(self.other)],
+        )
+
+    def test_dismiss_all(self):
+        etag = self.client.get(reverse("notif-poll"))["ETag"]
+
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse("dismiss-notifs"), {"all": "1"})
+
+        self.assertRedirects(response, "/")
+        self.assertQuerysetEqual(Notification.objects.all(), [repr(self.other)])
+        # the poll sees the change
+        response = self.client.get(reverse("notif-poll"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestPollNotifView(TestCase):
+    def setUp(self):
+        # the latest notification ids are cached across tests
+        cache.clear()
+        self.user = create_user_if_not_exists("testuser", "12345")
+        self.user2 = create_user_if_not_exists("testuser2", "12345")
+        self.user3 = create_user_if_not_exists("testuser3", "12345")
+        self.category = create_category_if_not_exists("test_category")
+        self.list1 = create_checklist(
+            title="list 1", content="content 1", user=self.user, category=self.category
+        )
+
+        self.follow = create_notif(self.user2, self.user, Notification.USER_FOLLOW)
+        self.client.login(username="testuser", password="12345")
+
+    def test_view_url(self):
+        url = resolve("/notif/poll/")
+        self.assertEqual(url.func.__name__, "poll_notif")
+
+    def test_view_guest(self):
+        self.client.logout()
+        response = self.client.get(reverse("notif-poll"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_since(self):
+        upvote = create_notif(
+            self.user2, self.user, Notification.UPVOTE, checklist=self.list1
+        )
+        # not for this user
+        create_notif(self.user, self.user2, Notification.USER_FOLLOW)
+
+        data = self.client.get(reverse("notif-poll")).json()
+        self.assertEqual(data["latest_id"], upvote.id)
+        self.assertEqual(
+            [notif["id"] for notif in data["notifications"]],
+            [upvote.id, self.follow.id],
+        )
+        self.assertEqual(
+            data["notifications"][0],
+            {
+                "id": upvote.id,
+                "type": Notification.UPVOTE,
+                "date": upvote.date_notified.isoformat(),
+                "actors": [{"username": "testuser2", "url": "/user/testuser2/"}],
+                "other_actor_count": 0,
+                "checklist": {
+                    "id": self.list1.id,
+                    "title": "list 1",
+                    "url": "/checklist/{}/".format(self.list1.id),
+                },
+            },
+        )
+
+        data = self.client.get(reverse("notif-poll"), {"since": self.follow.id}).json()
+        self.assertEqual([notif["id"] for notif in data["notifications"]], [upvote.id])
+
+        data = self.client.get(reverse("notif-poll"), {"since": upvote.id}).json()
+        self.assertEqual(data, {"latest_id": upvote.id, "notifications": []})
+
+    def test_not_modified(self):
+        response = self.client.get(reverse("notif-poll"))
+        etag = response["ETag"]
+        self.assertEqual(etag, '"{}-{}"'.format(self.user.id, self.follow.id))
+        self.assertIn("private", response["Cache-Control"])
+
+        # answered from the cached latest id - only the session and the user are read
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("notif-poll"),
+                {"since": self.follow.id},
+                HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 304)
+
+        # a single lookup once the cached id is gone
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("notif-poll"),
+                {"since": self.follow.id},
+                HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed(self):
+        etag = self.client.get(reverse("notif-poll"))["ETag"]
+
+        # coalesced into the existing notification, which moves to a new id
+        follow = create_notif(self.user3, self.user, Notification.USER_FOLLOW)
+        self.assertGreater(follow.id, self.follow.id)
+        self.assertEqual(follow.actor_count, 2)
+        self.assertEqual(Notification.objects.filter(toUser=self.user).count(), 1)
+
+        response = self.client.get(
+            reverse("notif-poll"), {"since": self.follow.id}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        data = response.json()
+        self.assertEqual(data["latest_id"], follow.id)
+        (notif,) = data["notifications"]
+        self.assertEqual(
+            [actor["username"] for actor in notif["actors"]],
+            ["testuser3", "testuser2"],
+        )
+
+        # dismissing changes it as well
+        etag = response["ETag"]
+        self.client.get(reverse("dismiss-notif", kwargs={"id": follow.id}))
+        response = self.client.get(reverse("notif-poll"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"latest_id": 0, "notifications": []})
+
+
 class TestFollowChecklistView(TestCase):
     def setUp(self):
         self.user = create_user_if_not_exists("testuser", "12345")
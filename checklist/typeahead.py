@@ -0,0 +1,252 @@
+# in-process prefix index behind the search suggestions of the navbar, answers a keystroke without a database query
+# web processes load it in the background when they start (see checklist_project/wsgi.py and asgi.py) and keep it current
+# through the signals in checklist/signals.py; changes saved by other processes show up after the next periodic reload
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.db import connections
+
+from checklist.models import Category, Checklist
+
+RELOAD_SECONDS = 300
+# words are cut to this length, longer query words are matched against the full name
+MAX_KEY_LENGTH = 32
+# queries this short match too many keys to rank on every keystroke, their best ids are kept until a key starting with them changes
+SHORT_QUERY_LENGTH = 3
+# best ids kept per short query, larger limits rank all matches
+TOP_SIZE = 10
+
+
+def get_keys(name):
+    # the words of name, so "trip" suggests "camping trip"; interned, a word used by many names is stored once
+    return {sys.intern(word[:MAX_KEY_LENGTH]) for word in normalize(name).split()}
+
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+
+class PrefixIndex:
+    # sorted (word, id) pairs as a list of interned words and a parallel array of 8 byte ids; a query is looked up by one of its
+    # words and checked against the names found, so the index holds one pointer and one id per word of every name
+    def __init__(self, entries=()):
+        # entries of (id, name, score)
+        self.lock = threading.Lock()
+        self.names = {}
+        pairs = []
+        for obj_id, name, score in entries:
+            self.names[obj_id] = (name, score)
+            pairs.extend((key, obj_id) for key in get_keys(name))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = array("q", (obj_id for _, obj_id in pairs))
+        # short query -> its best ids
+        self.top = {}
+        # counts add() and remove(), ids ranked meanwhile are not kept
+        self.changes = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, obj_id, name, score=0):
+        with self.lock:
+            self.remove_locked(obj_id)
+            self.names[obj_id] = (name, score)
+            self.forget(name)
+            for key in get_keys(name):
+                # ids of a word stay sorted, so they are found by bisection too
+                start = bisect_left(self.keys, key)
+                end = bisect_right(self.keys, key, lo=start)
+                position = bisect_left(self.ids, obj_id, lo=start, hi=end)
+                self.keys.insert(position, key)
+                self.ids.insert(position, obj_id)
+
+    def remove(self, obj_id):
+        with self.lock:
+            self.remove_locked(obj_id)
+
+    def remove_locked(self, obj_id):
+        if obj_id not in self.names:
+            return
+        name, _ = self.names.pop(obj_id)
+        self.forget(name)
+        for key in get_keys(name):
+            start = bisect_left(self.keys, key)
+            end = bisect_right(self.keys, key, lo=start)
+            position = bisect_left(self.ids, obj_id, lo=start, hi=end)
+            if position < end and self.ids[position] == obj_id:
+                del self.keys[position]
+                del self.ids[position]
+
+    def forget(self, name):
+        # the kept best ids of the short queries matching a key of name
+        self.changes += 1
+        for key in get_keys(name):
+            for length in range(1, SHORT_QUERY_LENGTH + 1):
+                self.top.pop(key[:length], None)
+
+    def get_candidates(self, query):
+        # ids of the names with a word equal to a whole word of query, or starting with its last word - whichever has fewest
+        words = query.split()
+        with self.lock:
+            ranges = []
+            for position, word in enumerate(words):
+                word = word[:MAX_KEY_LENGTH]
+                start = bisect_left(self.keys, word)
+                if position < len(words) - 1:
+                    end = bisect_right(self.keys, word, lo=start)
+                else:
+                    # every key starting with word sorts before word followed by the highest code point
+                    end = bisect_left(self.keys, word + chr(sys.maxunicode), lo=start)
+                ranges.append((end - start, start, end))
+            _, start, end = min(ranges)
+            return self.ids[start:end], self.changes
+
+    def match(self, query, candidates):
+        # the candidates whose name has a word starting with the whole query
+        if len(query.split()) == 1 and len(query) <= MAX_KEY_LENGTH:
+            return set(candidates)
+
+        found = set()
+        for obj_id in set(candidates):
+            entry = self.names.get(obj_id)
+            if entry is not None and " " + query in " " + normalize(entry[0]):
+                found.add(obj_id)
+        return found
+
+    def rank(self, obj_ids, limit):
+        # best scored first, ties by name; a name removed meanwhile is left out
+        names = self.names
+        entries = [(obj_id, names.get(obj_id)) for obj_id in obj_ids]
+        return [
+            obj_id
+            for obj_id, _ in heapq.nsmallest(
+                limit,
+                (entry for entry in entries if entry[1] is not None),
+                key=lambda entry: (-entry[1][1], entry[1][0]),
+            )
+        ]
+
+    def search(self, query, limit):
+        # [(id, name)] of the best scored names having a word starting with query
+        query = normalize(query)
+        if not query or limit < 1:
+            return []
+
+        short = len(query) <= SHORT_QUERY_LENGTH and limit <= TOP_SIZE
+        best = self.top.get(query) if short else None
+        if best is None:
+            # only finding the candidates holds the lock, updates do not wait for the ranking
+            candidates, changes = self.get_candidates(query)
+            best = self.rank(
+                self.match(query, candidates), TOP_SIZE if short else limit
+            )
+            if short:
+                with self.lock:
+                    if self.changes == changes:
+                        self.top[query] = best
+
+        entries = [(obj_id, self.names.get(obj_id)) for obj_id in best[:limit]]
+        return [(obj_id, entry[0]) for obj_id, entry in entries if entry is not None]
+
+
+class Suggestions:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checklists = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.loaded_at = None
+        self.loader = None
+
+    @property
+    def reloading(self):
+        # a thread rather than a flag, a process forked while loading has no loader running
+        return self.loader is not None and self.loader.is_alive()
+
+    def load(self):
+        # published checklists ranked by upvotes; upvote_count is updated without save() so scores refresh with the next reload
+        checklists = PrefixIndex(
+            Checklist.objects.filter(is_draft=False)
+            .values_list("id", "title", "upvote_count")
+            .iterator()
+        )
+        categories = PrefixIndex(
+            (category_id, name, 0)
+            for category_id, name in Category.objects.values_list("id", "name")
+        )
+
+        with self.lock:
+            self.checklists = checklists
+            self.categories = categories
+            self.loaded_at = time.monotonic()
+
+    def reload_in_background(self):
+        def reload():
+            try:
+                self.load()
+            finally:
+                # the thread has its own database connection
+                connections.close_all()
+
+        self.loader = threading.Thread(target=reload, daemon=True)
+        self.loader.start()
+
+    def warm_up(self):
+        # called when a server process starts, so no keystroke waits for the index to be loaded
+        if self.loaded_at is None and not self.reloading:
+            self.reload_in_background()
+
+    def search(self, query, limit):
+        if self.loaded_at is None:
+            if self.reloading:
+                # still warming up, nothing to suggest for a moment rather than a keystroke waiting for the whole load
+                return [], []
+            # not warmed up, e.g. under runserver or in tests
+            self.load()
+        elif time.monotonic() - self.loaded_at > RELOAD_SECONDS and not self.reloading:
+            # the stale index keeps answering while the new one is loaded
+            self.reload_in_background()
+
+        with self.lock:
+            checklists, categories = self.checklists, self.categories
+        return checklists.search(query, limit), categories.search(query, limit)
+
+    def update_checklist(self, checklist):
+        # before the first load there is nothing to keep current
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            if checklist.is_draft:
+                self.checklists.remove(checklist.id)
+            else:
+                self.checklists.add(
+                    checklist.id, checklist.title, checklist.upvote_count
+                )
+
+    def remove_checklist(self, checklist_id):
+        with self.lock:
+            self.checklists.remove(checklist_id)
+
+    def update_category(self, category):
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            self.categories.add(category.id, category.name)
+
+    def remove_category(self, category_id):
+        with self.lock:
+            self.categories.remove(category_id)
+
+    def reset(self):
+        # drop the index, it is loaded again on the next search
+        with self.lock:
+            self.checklists = PrefixIndex()
+            self.categories = PrefixIndex()
+            self.loaded_at = None
+
+
+suggestions = Suggestions()
@@ -82,6 +82,12 @@ urlpatterns = [
         name="checklist-follow",
     ),
     path("search/", SearchChecklistListView.as_view(), name="search"),
+    path("search/suggest/", views.search_suggest, name="search-suggest"),
+    path(
+        "search/cache-stats/",
+        views.search_cache_stats,
+        name="search-cache-stats",
+    ),
     path(
         "checklist/<str:category>/",
         CategoryChecklistListView.as_view(),
@@ -108,6 +114,8 @@ urlpatterns = [
         name="item-action",
     ),
     path("notif/<int:id>/dismiss/", views.dismiss_notif, name="dismiss-notif"),
+    path("notif/dismiss/", views.dismiss_notifs, name="dismiss-notifs"),
+    path("notif/poll/", views.poll_notif, name="notif-poll"),
     path(
         "checklist/<int:checklist_id>/comment/",
         views.submit_comment,
@@ -1,9 +1,20 @@
+from django.core import signing
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
+from checklist.models import (
+    FEED_DEFERRED_FIELDS,
+    Bookmark,
+    Checklist,
+    FollowChecklist,
+    Upvote,
+)
 
-def paginate_content(checklist_upvotes, page, paginate_by=5):
-    # add paginator object
-    paginator = Paginator(list(checklist_upvotes), paginate_by)
+
+def paginate_content(checklist_upvotes, page, paginate_by=5, get_rows=None):
+    # add paginator object; a queryset is sliced with LIMIT/OFFSET in the database instead of being loaded into memory
+    paginator = Paginator(checklist_upvotes, paginate_by)
 
     try:
         page_checklist_upvotes = paginator.page(page)
@@ -12,62 +23,229 @@ def paginate_content(checklist_upvotes, page, paginate_by=5):
     except EmptyPage:
         page_checklist_upvotes = paginator.page(paginator.num_pages)
 
+    # build the rows passed to the template only for the objects on the visible page
+    if get_rows is not None:
+        page_checklist_upvotes.object_list = get_rows(
+            list(page_checklist_upvotes.object_list)
+        )
+
     return page_checklist_upvotes
 
 
-def get_upvote_bookmark_list(checklists_var, is_anonymous, user):
-    upvotes_cnt_list = []
-    upvoted_bool_list = []
-    bookmarked_bool_list = []
+# KEYSET (CURSOR) PAGINATION - refer https://use-the-index-luke.com/no-offset
+# the cursor is an opaque signed token over (date_posted, id) of the row where the page starts, so any page costs the same and no COUNT(*) is needed
+CURSOR_SALT = "checklist.cursor"
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
 
-    for checklist in checklists_var:
-        # for each checklist, fetch the count of upvotes
-        # upvote_set - set of all upvotes who have foreign key checklist as the current checklist
-        upvotes_cnt_list.append(checklist.upvote_set.count())
 
-        # if user is not anonymous
-        if not is_anonymous:
+def encode_cursor(checklist, reverse=False):
+    return signing.dumps(
+        [checklist.date_posted.isoformat(), checklist.id, reverse], salt=CURSOR_SALT
+    )
 
-            # if any of the upvote objects have this checklist as foreign key and the user for that object is the current logged in user, then append True to the list
-            if checklist.upvote_set.filter(user=user):
-                upvoted_bool_list.append(True)
-            else:
-                upvoted_bool_list.append(False)
 
-            if checklist.bookmark_set.filter(user=user):
-                bookmarked_bool_list.append(True)
-            else:
-                bookmarked_bool_list.append(False)
-        # need this else clause so that empty lists for upvoted and bookmarked are not passed in checklist_upvotes while zipping
+def decode_cursor(cursor):
+    # returns (date_posted, id, reverse) or None if the cursor is missing or has been tampered with
+    try:
+        date_posted, id, reverse = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+    date_posted = parse_datetime(date_posted)
+    if date_posted is None:
+        return None
+
+    return date_posted, id, reverse
+
+
+def paginate_cursor(checklists_var, cursor, paginate_by=5, get_rows=None):
+    position = decode_cursor(cursor)
+
+    if position is None:
+        reverse = False
+        checklists_var = checklists_var.order_by("-date_posted", "-id")
+    else:
+        date_posted, id, reverse = position
+        if reverse:
+            # walk backwards from the cursor, rows are flipped back into feed order below
+            checklists_var = checklists_var.filter(
+                Q(date_posted__gt=date_posted) | Q(date_posted=date_posted, id__gt=id)
+            ).order_by("date_posted", "id")
+        else:
+            checklists_var = checklists_var.filter(
+                Q(date_posted__lt=date_posted) | Q(date_posted=date_posted, id__lt=id)
+            ).order_by("-date_posted", "-id")
+
+    # fetch one extra row to know whether there is another page in the direction we are walking
+    checklists = list(checklists_var[: paginate_by + 1])
+    has_more = len(checklists) > paginate_by
+    checklists = checklists[:paginate_by]
+
+    next_cursor = None
+    previous_cursor = None
+    if checklists:
+        if reverse:
+            checklists.reverse()
+            next_cursor = encode_cursor(checklists[-1])
+            if has_more:
+                previous_cursor = encode_cursor(checklists[0], reverse=True)
         else:
-            upvoted_bool_list.append(True)
-            bookmarked_bool_list.append(True)
-
-    return upvotes_cnt_list, upvoted_bool_list, bookmarked_bool_list
-
-
-def get_data_and_context(context, request, paginate_by, checklists_var):
-    is_anonymous = request.user.is_anonymous
-    # user = request.user
-    (
-        upvotes_cnt_list,
-        upvoted_bool_list,
-        bookmarked_bool_list,
-    ) = get_upvote_bookmark_list(checklists_var, is_anonymous, request.user)
-
-    print(upvotes_cnt_list)
-    print(upvoted_bool_list)
-    print(bookmarked_bool_list)
-
-    checklist_upvotes = zip(
-        checklists_var,
-        upvotes_cnt_list,
-        upvoted_bool_list,
-        bookmarked_bool_list,
+            if has_more:
+                next_cursor = encode_cursor(checklists[-1])
+            if position is not None:
+                previous_cursor = encode_cursor(checklists[0], reverse=True)
+
+    if get_rows is not None:
+        checklists = get_rows(checklists)
+
+    return CursorPage(checklists, next_cursor, previous_cursor)
+
+
+# VIEWER STATE - which of a set of checklists the logged in user has upvoted, bookmarked and followed
+class ViewerState:
+    def __init__(self):
+        self.loaded_ids = set()
+        self.upvoted = set()
+        self.bookmarked = set()
+        self.followed = set()
+
+
+def get_viewer_state(request, checklist_ids):
+    # memoized on the request, so the ids already looked up by another part of the page are not queried again
+    if not hasattr(request, "_viewer_state"):
+        request._viewer_state = ViewerState()
+    viewer_state = request._viewer_state
+
+    new_ids = set(checklist_ids) - viewer_state.loaded_ids
+    if not new_ids:
+        return viewer_state
+    viewer_state.loaded_ids |= new_ids
+
+    # flags are only relevant to toggle buttons for logged in users, so they are True for anonymous users
+    if request.user.is_anonymous:
+        viewer_state.upvoted |= new_ids
+        viewer_state.bookmarked |= new_ids
+        viewer_state.followed |= new_ids
+        return viewer_state
+
+    # one set-based query per relation, whatever the number of checklists
+    viewer_state.upvoted.update(
+        Upvote.objects.filter(user=request.user, checklist_id__in=new_ids).values_list(
+            "checklist_id", flat=True
+        )
+    )
+    viewer_state.bookmarked.update(
+        Bookmark.objects.filter(
+            user=request.user, checklist_id__in=new_ids
+        ).values_list("checklist_id", flat=True)
+    )
+    viewer_state.followed.update(
+        FollowChecklist.objects.filter(
+            fromUser=request.user, toChecklist_id__in=new_ids
+        ).values_list("toChecklist_id", flat=True)
+    )
+
+    return viewer_state
+
+
+# to be mixed into list views which support cursor pagination
+class ManualPaginationMixin:
+    # for ListViews building their page in get_context_data (paginate_content / paginate_cursor), which keep paginate_by as
+    # the page size - ListView's own pagination would only add a COUNT(*) over the whole table of the model
+    def get_paginate_by(self, queryset):
+        return None
+
+
+def get_checklist_rows(request, checklists):
+    viewer_state = get_viewer_state(request, [checklist.id for checklist in checklists])
+
+    return [
+        (
+            checklist,
+            checklist.upvote_count,
+            checklist.id in viewer_state.upvoted,
+            checklist.id in viewer_state.bookmarked,
+        )
+        for checklist in checklists
+    ]
+
+
+def get_data_and_context(
+    context, request, paginate_by, checklists_var, allow_cursor=False
+):
+    def get_rows(checklists):
+        return get_checklist_rows(request, checklists)
+
+    # opt-in keyset pagination when the url carries a "cursor" parameter (empty for the first page)
+    if allow_cursor and "cursor" in request.GET:
+        page_checklist_upvotes = paginate_cursor(
+            checklists_var,
+            request.GET.get("cursor"),
+            paginate_by,
+            get_rows=get_rows,
+        )
+
+        context["checklist_upvotes"] = page_checklist_upvotes
+        context["is_paginated"] = False
+        context["is_cursor_paginated"] = page_checklist_upvotes.has_other_pages()
+
+        return context
+
+    # only the checklists on the requested page are fetched, and the viewer's upvoted/bookmarked flags are looked up for them alone
+    page = request.GET.get("page")
+    page_checklist_upvotes = paginate_content(
+        checklists_var, page, paginate_by, get_rows=get_rows
     )
 
+    context["checklist_upvotes"] = page_checklist_upvotes
+    context["is_paginated"] = page_checklist_upvotes.has_other_pages
+
+    return context
+
+
+def get_ranked_data_and_context(context, request, paginate_by, checklist_ids):
+    # checklist_ids is an already ranked and bounded list, e.g. search results; the page is sliced from it without a COUNT(*)
+    def get_rows(page_ids):
+        checklists = (
+            Checklist.with_related(Checklist.objects.all())
+            .defer(*FEED_DEFERRED_FIELDS)
+            .in_bulk(page_ids)
+        )
+        # keep the ranked order; a checklist deleted in the meantime is left out
+        return get_checklist_rows(
+            request,
+            [
+                checklists[checklist_id]
+                for checklist_id in page_ids
+                if checklist_id in checklists
+            ],
+        )
+
     page = request.GET.get("page")
-    page_checklist_upvotes = paginate_content(checklist_upvotes, page, paginate_by)
+    page_checklist_upvotes = paginate_content(
+        checklist_ids, page, paginate_by, get_rows=get_rows
+    )
 
     context["checklist_upvotes"] = page_checklist_upvotes
     context["is_paginated"] = page_checklist_upvotes.has_other_pages
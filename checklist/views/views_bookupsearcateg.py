@@ -1,16 +1,24 @@
 # mixins for checking if user is logged in and the checklist author is the same as logged in user
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
 from django.views.generic import ListView
 
-from checklist.models import Bookmark, Category, Checklist, Upvote
+from checklist.models import FEED_DEFERRED_FIELDS, Bookmark, Category, Checklist, Upvote
+from checklist.search import get_item_matches, get_search_results
 
-from .helper_methods import get_data_and_context, paginate_content
+from .helper_methods import (
+    ManualPaginationMixin,
+    get_data_and_context,
+    get_ranked_data_and_context,
+    get_viewer_state,
+    paginate_content,
+)
 
 
 # VIEW BOOKMARKS PAGE
-class BookmarkChecklistListView(LoginRequiredMixin, ListView):
+class BookmarkChecklistListView(LoginRequiredMixin, ManualPaginationMixin, ListView):
     model = Bookmark
     template_name = "checklist/bookmark_checklists.html"
     paginate_by = 5
@@ -21,28 +29,32 @@ class BookmarkChecklistListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super(BookmarkChecklistListView, self).get_context_data(**kwargs)
 
-        upvotes_cnt_list = []
-        upvoted_bool_list = []
-
-        bookmarks_var = Bookmark.objects.filter(user=self.request.user)
+        bookmarks_var = (
+            Bookmark.objects.filter(user=self.request.user)
+            .select_related("checklist__author__profile", "checklist__category")
+            .defer(*("checklist__" + field for field in FEED_DEFERRED_FIELDS))
+            .annotate(upvote_cnt=F("checklist__upvote_count"))
+            .order_by("id")
+        )
 
-        for bookmark in bookmarks_var:
-            upvotes_cnt_list.append(
-                Upvote.objects.filter(checklist=bookmark.checklist).count()
+        # upvoted flag is looked up only for the bookmarks on the visible page
+        def get_rows(bookmarks):
+            viewer_state = get_viewer_state(
+                self.request, [bookmark.checklist_id for bookmark in bookmarks]
             )
-
-            if not self.request.user.is_anonymous:
-                if bookmark.checklist.upvote_set.filter(user=self.request.user):
-                    upvoted_bool_list.append(True)
-                else:
-                    upvoted_bool_list.append(False)
-
-        checklist_upvotes = zip(bookmarks_var, upvotes_cnt_list, upvoted_bool_list)
+            return [
+                (
+                    bookmark,
+                    bookmark.upvote_cnt,
+                    bookmark.checklist_id in viewer_state.upvoted,
+                )
+                for bookmark in bookmarks
+            ]
 
         page = self.request.GET.get("page")
 
         page_checklist_upvotes = paginate_content(
-            checklist_upvotes, page, self.paginate_by
+            bookmarks_var, page, self.paginate_by, get_rows=get_rows
         )
 
         context["checklist_upvotes"] = page_checklist_upvotes
@@ -53,7 +65,7 @@ class BookmarkChecklistListView(LoginRequiredMixin, ListView):
 
 
 # VIEW UPVOTE PAGE
-class UpvoteChecklistListView(LoginRequiredMixin, ListView):
+class UpvoteChecklistListView(LoginRequiredMixin, ManualPaginationMixin, ListView):
     model = Upvote
     template_name = "checklist/upvote_checklists.html"
     paginate_by = 5
@@ -61,20 +73,23 @@ class UpvoteChecklistListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super(UpvoteChecklistListView, self).get_context_data(**kwargs)
 
-        upvotes_cnt_list = []
-        upvotes_var = Upvote.objects.filter(user=self.request.user)
-
-        for upvote in upvotes_var:
-            upvotes_cnt_list.append(
-                Upvote.objects.filter(checklist=upvote.checklist).count()
-            )
-
-        checklist_upvotes = zip(upvotes_var, upvotes_cnt_list)
+        upvotes_var = (
+            Upvote.objects.filter(user=self.request.user)
+            .select_related("checklist__author__profile", "checklist__category")
+            .defer(*("checklist__" + field for field in FEED_DEFERRED_FIELDS))
+            .annotate(upvote_cnt=F("checklist__upvote_count"))
+            .order_by("id")
+        )
 
         page = self.request.GET.get("page")
 
         page_checklist_upvotes = paginate_content(
-            checklist_upvotes, page, self.paginate_by
+            upvotes_var,
+            page,
+            self.paginate_by,
+            get_rows=lambda upvotes: [
+                (upvote, upvote.upvote_cnt) for upvote in upvotes
+            ],
         )
 
         context["checklist_upvotes"] = page_checklist_upvotes
@@ -85,36 +100,62 @@ class UpvoteChecklistListView(LoginRequiredMixin, ListView):
 
 
 # SEARCH RESULTS PAGE
-class SearchChecklistListView(ListView):
+class SearchChecklistListView(ManualPaginationMixin, ListView):
     model = Checklist
     template_name = "checklist/search_checklists.html"
+    # results are paginated from the ranked ids by get_ranked_data_and_context
     paginate_by = 5
 
     def get_context_data(self, **kwargs):
         context = super(SearchChecklistListView, self).get_context_data(**kwargs)
 
         query = ""
+        category_id = None
+        facets = []
         if self.request.GET:
-            checklists_var = None
+            checklist_ids = []
             # if a query string is present in URL
             if ("q" in self.request.GET) and self.request.GET["q"].strip():
                 query = self.request.GET["q"]
-                checklists_var = Checklist.objects.filter(
-                    (Q(title__icontains=query) | Q(content__icontains=query))
-                    & Q(is_draft=False)
-                )
+                # optional category filter, picked from the facets
+                try:
+                    category_id = int(self.request.GET.get("category", ""))
+                except ValueError:
+                    category_id = None
+                # ranked through the full-text index and cached with the category counts, see checklist/search.py
+                checklist_ids, facets = get_search_results(query, category_id)
+
+        context = get_ranked_data_and_context(
+            context, self.request, self.paginate_by, checklist_ids
+        )
 
-        context = get_data_and_context(
-            context, self.request, self.paginate_by, checklists_var
+        # items of the checklists on the page which matched, looked up in one query
+        page_checklists = [row[0] for row in context["checklist_upvotes"]]
+        item_matches = get_item_matches(
+            query, [checklist.id for checklist in page_checklists]
         )
+        for checklist in page_checklists:
+            checklist.matching_items = item_matches.get(checklist.id, [])
+
         context["title"] = "search"
         context["query_string"] = query
+        context["selected_category"] = category_id
+        context["all_categories_query"] = urlencode({"q": query})
+        context["category_facets"] = [
+            {
+                "id": facet_id,
+                "name": name,
+                "count": count,
+                "query": urlencode({"q": query, "category": facet_id}),
+            }
+            for facet_id, name, count in facets
+        ]
 
         return context
 
 
 # DISPLAY CHECKLISTS FOR A CATEGORY PAGE
-class CategoryChecklistListView(ListView):
+class CategoryChecklistListView(ManualPaginationMixin, ListView):
     model = Checklist
     template_name = (
         "checklist/category_checklists.html"  # <app_name>/<model>_<viewtype>.html
@@ -127,12 +168,20 @@ class CategoryChecklistListView(ListView):
         category = get_object_or_404(Category, name=self.kwargs.get("category"))
 
         # category_id = Category.objects.filter(name=self.kwargs.get('category')).first().id
-        checklists_var = Checklist.objects.filter(
-            category_id=category.id, is_draft=False
-        ).order_by("-date_posted")
+        checklists_var = (
+            Checklist.with_related(
+                Checklist.objects.filter(category_id=category.id, is_draft=False)
+            )
+            .defer(*FEED_DEFERRED_FIELDS)
+            .order_by("-date_posted")
+        )
 
         context = get_data_and_context(
-            context, self.request, self.paginate_by, checklists_var
+            context,
+            self.request,
+            self.paginate_by,
+            checklists_var,
+            allow_cursor=True,
         )
         context["title"] = "user"
 
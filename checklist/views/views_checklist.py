@@ -3,6 +3,8 @@ import logging
 # mixins for checking if user is logged in and the checklist author is the same as logged in user
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from django.views.generic import (
     CreateView,
@@ -12,16 +14,21 @@ from django.views.generic import (
     UpdateView,
 )
 
+from checklist.fanout import fan_out_checklist
 from checklist.forms import CommentForm
-from checklist.models import Checklist, FollowChecklist
+from checklist.models import Checklist, Comment
 
-from .helper_methods import get_data_and_context
+from .helper_methods import (
+    ManualPaginationMixin,
+    get_data_and_context,
+    get_viewer_state,
+)
 
 logger = logging.getLogger(__name__)
 
 
 # CHECKLIST HOME - display all checklists order by most recent - this class is used when user navigates to "localhost:8000/"
-class ChecklistListView(ListView):
+class ChecklistListView(ManualPaginationMixin, ListView):
     model = Checklist  # what model to query in order to create the list
     template_name = "checklist/home.html"  # <app_name>/<model>_<viewtype>.html
     paginate_by = 5
@@ -35,7 +42,11 @@ class ChecklistListView(ListView):
         # .exclude(author=self.request.user) - if user's own checklists not to be displayed on home page
 
         context = get_data_and_context(
-            context, self.request, self.paginate_by, checklists_var
+            context,
+            self.request,
+            self.paginate_by,
+            checklists_var,
+            allow_cursor=True,
         )
 
         context["title"] = "home"
@@ -67,7 +78,7 @@ class ChecklistListView(ListView):
 
 
 # DISPLAY CHECKLISTS BY LOGGED IN USER
-class UserChecklistListView(ListView):
+class UserChecklistListView(ManualPaginationMixin, ListView):
     model = Checklist
     template_name = (
         "checklist/user_checklists.html"  # <app_name>/<model>_<viewtype>.html
@@ -85,7 +96,7 @@ class UserChecklistListView(ListView):
         user = get_object_or_404(User, username=self.kwargs.get("username"))
 
         if not self.request.user.is_anonymous:
-            if self.request.user.fromUser.filter(toUser=user):
+            if self.request.user.fromUser.filter(toUser=user).exists():
                 if_followed = True
             else:
                 if_followed = False
@@ -96,7 +107,11 @@ class UserChecklistListView(ListView):
         checklists_var = Checklist.get_checklists(is_draft=False, author=user)
 
         context = get_data_and_context(
-            context, self.request, self.paginate_by, checklists_var
+            context,
+            self.request,
+            self.paginate_by,
+            checklists_var,
+            allow_cursor=True,
         )
 
         context["if_followed"] = if_followed
@@ -105,7 +120,7 @@ class UserChecklistListView(ListView):
 
 
 # DRAFT CHECKLISTS BY USER
-class UserDraftChecklistListView(LoginRequiredMixin, ListView):
+class UserDraftChecklistListView(LoginRequiredMixin, ManualPaginationMixin, ListView):
     model = Checklist
     template_name = "checklist/user_checklists.html"
     paginate_by = 5
@@ -140,46 +155,46 @@ class UserDraftChecklistListView(LoginRequiredMixin, ListView):
 class ChecklistDetailView(DetailView):
     model = Checklist
 
+    def get_queryset(self):
+        # the page renders the sanitized content_html only
+        return Checklist.with_related(Checklist.objects.all()).defer(
+            "content", "content_text"
+        )
+
     def get_context_data(self, **kwargs):
         context = super(ChecklistDetailView, self).get_context_data(**kwargs)
 
-        chk = get_object_or_404(Checklist, id=self.kwargs.get("pk"))
-
-        # if user is not anonymous, meaning user is logged in
-        if not self.request.user.is_anonymous:
-            if chk.upvote_set.filter(user=self.request.user):
-                if_upvoted = True
-            else:
-                if_upvoted = False
-
-            if chk.bookmark_set.filter(user=self.request.user):
-                if_bookmarked = True
-            else:
-                if_bookmarked = False
+        chk = self.object
 
-            if FollowChecklist.objects.filter(toChecklist=chk).filter(
-                fromUser=self.request.user
-            ):
-                if_followed = True
-            else:
-                if_followed = False
-        else:
-            if_upvoted = True
-            if_bookmarked = True
-            if_followed = True
+        # flags are True for anonymous users; the viewer state service takes care of that
+        viewer_state = get_viewer_state(self.request, [chk.id])
+        if_upvoted = chk.id in viewer_state.upvoted
+        if_bookmarked = chk.id in viewer_state.bookmarked
+        if_followed = chk.id in viewer_state.followed
 
         # if_upvoted and if_bookmarked are flags I use to toggle type of button shown on frontend but this is relevant only when user is logged in. If not logged in, this is not relevant.
 
-        uvote = (
-            chk.upvote_set.count()
-        )  # Upvote.objects.filter(checklist_id=self.kwargs.get("pk")).count()
+        uvote = chk.upvote_count  # denormalized count of Upvote rows
         itemset = chk.item_set.order_by("title")  # ,'completed')
 
         # for comments stuff:
         # 1. https://www.youtube.com/watch?v=KrGQ2Nrz4Dc
         # 2. https://djangocentral.com/creating-comments-system-with-django/
 
-        comments = chk.comments.all().filter(parent=None)
+        # commenters' profiles and the replies of every comment are fetched up front instead of per comment in the template
+        comments = (
+            chk.comments.filter(parent=None)
+            .select_related("user__profile")
+            .defer("body", "body_text")
+            .prefetch_related(
+                Prefetch(
+                    "comment_set",
+                    queryset=Comment.objects.select_related("user__profile").defer(
+                        "body", "body_text"
+                    ),
+                )
+            )
+        )
         comment_form = CommentForm()
 
         context["if_upvoted"] = if_upvoted
@@ -207,7 +222,12 @@ class ChecklistCreateView(LoginRequiredMixin, CreateView):
     # to link logged in user as author to the checklist being created
     def form_valid(self, form):
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # followers of the author are told in the background
+            if not self.object.is_draft:
+                fan_out_checklist.delay(self.object.id)
+        return response
 
 
 # UPDATE CHECKLIST
@@ -219,7 +239,14 @@ class ChecklistUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     # to link logged in user as author to the checklist being updated
     def form_valid(self, form):
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        # form.instance already holds the posted values, the form's initial ones are those of the saved checklist
+        was_draft = form.initial.get("is_draft", False)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # unchecking "is_draft" publishes the checklist like publish_checklist does, followers are told in the background
+            if was_draft and not self.object.is_draft:
+                fan_out_checklist.delay(self.object.id)
+        return response
 
     # test_func is function invoked by the UserPassesTestMixin to see if our user passes a certain test condition
     def test_func(self):
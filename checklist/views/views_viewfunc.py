@@ -1,13 +1,21 @@
 import logging
 
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 
 # mixins for checking if user is logged in and the checklist author is the same as logged in user
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 
+from checklist.context_processors import NOTIF_DROPDOWN_LIMIT
+from checklist.fanout import fan_out_checklist
 from checklist.forms import CommentForm
 from checklist.models import (
     Bookmark,
@@ -19,6 +27,15 @@ from checklist.models import (
     Notification,
     Upvote,
 )
+from checklist.notifications import (
+    get_latest_notification_id,
+    get_new_notifications,
+    invalidate_latest_notification_id,
+    serialize_notification,
+)
+from checklist.search import result_cache
+from checklist.tasks import index_checklist_items, notify
+from checklist.typeahead import suggestions
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +47,47 @@ def about(request):
     return render(request, "checklist/about.html", {"title_new": "about"})
 
 
+# SEARCH SUGGESTIONS FOR THE NAVBAR SEARCH BAR
+SUGGESTION_LIMIT = 5
+MAX_SUGGESTION_LIMIT = 10
+
+
+def search_suggest(request):
+    # served from the in-process prefix index, no database query per keystroke
+    try:
+        limit = min(
+            max(int(request.GET.get("limit", SUGGESTION_LIMIT)), 1),
+            MAX_SUGGESTION_LIMIT,
+        )
+    except ValueError:
+        limit = SUGGESTION_LIMIT
+
+    checklists, categories = suggestions.search(request.GET.get("q", ""), limit)
+
+    return JsonResponse(
+        {
+            "checklists": [
+                {
+                    "id": checklist_id,
+                    "title": title,
+                    "url": reverse("checklist-detail", kwargs={"pk": checklist_id}),
+                }
+                for checklist_id, title in checklists
+            ],
+            "categories": [
+                {"name": name, "url": reverse("category", kwargs={"category": name})}
+                for _, name in categories
+            ],
+        }
+    )
+
+
+# SEARCH CACHE COUNTERS - of the process serving the request
+@staff_member_required
+def search_cache_stats(request):
+    return JsonResponse({"results": result_cache.stats()})
+
+
 # UPVOTE CHECKLIST FUNCTIONALITY
 @login_required
 def upvote_checklist(request, checklist_id):
@@ -55,27 +113,36 @@ def upvote_checklist(request, checklist_id):
         )
         msg = ""
         if obj:
-            obj.delete()
+            # upvote row and the denormalized counter on the checklist change together
+            with transaction.atomic():
+                deleted, _ = obj.delete()
+                Checklist.objects.filter(id=checklist_id).update(
+                    upvote_count=F("upvote_count") - deleted
+                )
             msg = "Upvote retracted!"
         else:
             upvote_obj = Upvote(
                 user=request.user,
                 checklist=Checklist.objects.get(id=checklist_id),
             )
-            upvote_obj.save()
+            with transaction.atomic():
+                upvote_obj.save()
+                # F() expression so concurrent upvotes increment the counter in the database without a lost update
+                Checklist.objects.filter(id=checklist_id).update(
+                    upvote_count=F("upvote_count") + 1
+                )
+
+                # also update notifications table so relevant notif can be shown to author, in the background
+                checklist = upvote_obj.checklist
+                notify.delay(
+                    request.user.id,
+                    checklist.author_id,
+                    Notification.UPVOTE,
+                    checklist.id,
+                )
 
             msg = "Checklist upvoted!"
 
-            # also update notifications table so relevant notif can be shown to author
-            fromUser = request.user
-            toUser = Checklist.objects.get(id=checklist_id).author
-            Notification(
-                fromUser=fromUser,
-                toUser=toUser,
-                notif_type=1,
-                checklist=Checklist.objects.get(id=checklist_id),
-            ).save()
-
         messages.success(request, msg)
 
     if request.META.get("HTTP_REFERER"):
@@ -138,7 +205,7 @@ def item_action(request, item_id, action_type):
 
         if action_type == "complete":
             obj.completed = not obj.completed
-            obj.save()
+            obj.save(update_fields=["completed"])
 
             msg = "Item Ticked/Un-ticked!"
         elif action_type == "delete":
@@ -164,8 +231,13 @@ def publish_checklist(request, checklist_id):
         messages.error(request, msg)
     else:
         obj = Checklist.objects.get(id=checklist_id)
+        was_draft = obj.is_draft
         obj.is_draft = False
-        obj.save()
+        with transaction.atomic():
+            obj.save()
+            # followers of the author are told in the background
+            if was_draft:
+                fan_out_checklist.delay(obj.id)
 
         msg = "Checklist published and removed from drafts!"
         messages.success(request, msg)
@@ -196,12 +268,11 @@ def follow_user(request, username):
             obj.delete()
             msg = "User unfollowed!"
         else:
-            Follow(fromUser=request.user, toUser=toUser).save()
+            with transaction.atomic():
+                Follow(fromUser=request.user, toUser=toUser).save()
+                notify.delay(request.user.id, toUser.id, Notification.USER_FOLLOW)
             msg = "User followed!"
 
-            fromUser = request.user
-            Notification(fromUser=fromUser, toUser=toUser, notif_type=2).save()
-
         messages.success(request, msg)
 
     if request.META.get("HTTP_REFERER"):
@@ -228,19 +299,27 @@ def save_and_edit(request, checklist_id):
             category=old_obj.category,
         ):
 
-            new_obj = Checklist(
-                title=new_title,
-                content=old_obj.content,
-                author=request.user,
-                date_posted=timezone.now(),
-                category=old_obj.category,
-            )
-            new_obj.save()
-
-            for item in old_obj.item_set.all():
-                item.pk = None
-                item.checklist = new_obj
-                item.save()
+            # the copy and its items are committed together, the items with a single insert before redirecting to the copy so it
+            # shows them; only indexing them is left to the background
+            with transaction.atomic():
+                new_obj = Checklist(
+                    title=new_title,
+                    content=old_obj.content,
+                    author=request.user,
+                    date_posted=timezone.now(),
+                    category=old_obj.category,
+                )
+                new_obj.save()
+
+                Item.objects.bulk_create(
+                    [
+                        Item(title=title, completed=completed, checklist=new_obj)
+                        for title, completed in old_obj.item_set.order_by(
+                            "id"
+                        ).values_list("title", "completed")
+                    ]
+                )
+                index_checklist_items.delay(new_obj.id)
 
             msg = "Checklist saved. You can now modify it as your own!"
             messages.success(request, msg)
@@ -268,7 +347,8 @@ def save_and_edit(request, checklist_id):
 # DISMISS NOTIF
 @login_required
 def dismiss_notif(request, id):
-    Notification.objects.filter(id=id).delete()
+    Notification.objects.filter(id=id, toUser=request.user).delete()
+    invalidate_latest_notification_id([request.user.id])
 
     if request.META.get("HTTP_REFERER"):
         if "login" in request.META.get("HTTP_REFERER") and "next" in request.META.get(
@@ -279,6 +359,58 @@ def dismiss_notif(request, id):
     return redirect(request.META.get("HTTP_REFERER", "checklist-home"))
 
 
+# DISMISS ALL OR SELECTED NOTIFICATIONS
+MAX_DISMISS_IDS = 100
+
+
+@login_required
+@require_POST
+def dismiss_notifs(request):
+    # one DELETE statement, notifications have no delete signal receivers or related rows to collect first
+    notifs = Notification.objects.filter(toUser=request.user)
+    if not request.POST.get("all"):
+        ids = []
+        for notif_id in request.POST.getlist("ids")[:MAX_DISMISS_IDS]:
+            # isdigit() would let through digits int() rejects, such as "²"
+            try:
+                ids.append(int(notif_id))
+            except ValueError:
+                pass
+        notifs = notifs.filter(id__in=ids)
+    notifs.delete()
+    invalidate_latest_notification_id([request.user.id])
+
+    return redirect(request.META.get("HTTP_REFERER", "checklist-home"))
+
+
+# POLL NOTIFICATIONS - newer than the ones the page already shows
+def get_notif_etag(request):
+    # changes with every new or changed notification of the user, answered from the cache when possible
+    return "{}-{}".format(request.user.id, get_latest_notification_id(request.user.id))
+
+
+@login_required
+@condition(etag_func=get_notif_etag)
+def poll_notif(request):
+    # unchanged polls are answered with 304 by the condition decorator before getting here
+    try:
+        since = max(int(request.GET.get("since", 0)), 0)
+    except ValueError:
+        since = 0
+
+    notifs = get_new_notifications(request.user.id, since, NOTIF_DROPDOWN_LIMIT)
+
+    response = JsonResponse(
+        {
+            "latest_id": max([notif.id for notif in notifs] + [since]),
+            "notifications": [serialize_notification(notif) for notif in notifs],
+        }
+    )
+    # browsers revalidate with the ETag on every poll, shared caches never store it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 # FOLLOW CHECKLIST
 @login_required
 def follow_checklist(request, checklist_id):
@@ -296,17 +428,16 @@ def follow_checklist(request, checklist_id):
             obj.delete()
             msg = "Checklist unfollowed!"
         else:
-            FollowChecklist(fromUser=request.user, toChecklist=checklist).save()
+            with transaction.atomic():
+                FollowChecklist(fromUser=request.user, toChecklist=checklist).save()
+                notify.delay(
+                    request.user.id,
+                    checklist.author_id,
+                    Notification.CHECKLIST_FOLLOW,
+                    checklist.id,
+                )
             msg = "Checklist followed!"
 
-            fromUser = request.user
-            Notification(
-                fromUser=fromUser,
-                toUser=checklist.author,
-                notif_type=3,
-                checklist=checklist,
-            ).save()
-
         messages.success(request, msg)
 
     if request.META.get("HTTP_REFERER"):
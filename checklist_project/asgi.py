@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "checklist_project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are loaded
+from checklist.stream import STREAM_PATH, notification_stream  # noqa: E402
+from checklist.typeahead import suggestions  # noqa: E402
+
+# loaded while the process starts serving
+suggestions.warm_up()
+
+
+async def application(scope, receive, send):
+    # the notification stream is a long lived response, which Django 3.0 views cannot serve
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        await notification_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "checklist.middleware.QueryStatsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -60,6 +61,9 @@ MIDDLEWARE = [
     "social_django.middleware.SocialAuthExceptionMiddleware",
 ]
 
+# SQL query count and DB time per view as X-DB-Query-Count / X-DB-Time-Ms response headers and log lines, see checklist/middleware.py
+QUERY_STATS_ENABLED = os.environ.get("QUERY_STATS_ENABLED") == "True"
+
 ROOT_URLCONF = "checklist_project.urls"
 
 TEMPLATES = [
@@ -97,6 +101,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# version stamps and cached notification ids must be seen by every web and worker process, see checklist/cache.py - so never the per-process default LocMemCache
+# memcached when MEMCACHE_SERVERS is set (e.g. the MemCachier add-on on Heroku), otherwise a table in the database, created by "python manage.py createcachetable"
+
+if os.environ.get("MEMCACHE_SERVERS"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+            "LOCATION": os.environ["MEMCACHE_SERVERS"].split(","),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "checklist_cache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -234,7 +259,10 @@ LOGGING = {
             "filename": "tmp/debug.log",
         },
     },
-    "loggers": {"": {"level": "DEBUG", "handlers": ["file"]}},
+    "loggers": {
+        "": {"level": "DEBUG", "handlers": ["file"]},
+        "checklist.middleware": {"level": "INFO", "handlers": ["console"]},
+    },
 }
 logging.config.dictConfig(LOGGING)
 
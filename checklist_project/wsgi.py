@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "checklist_project.settings")
 
 application = get_wsgi_application()
+
+# imported once the apps are loaded; the search suggestions are loaded while the process starts serving
+from checklist.typeahead import suggestions  # noqa: E402
+
+suggestions.warm_up()
@@ -0,0 +1,10 @@
+# side effects of requests, run in the background by "manage.py run_worker" - see checklist/jobs.py
+from checklist.jobs import job
+
+from .models import Profile
+
+
+@job
+def delete_profile_image(name):
+    # remove a replaced profile picture so unused ones don't clutter the storage; a missing file is not an error
+    Profile._meta.get_field("image").storage.delete(name)
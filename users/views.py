@@ -1,11 +1,10 @@
-import os
-
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import PasswordChangeDoneView  # noqa: F401
 from django.shortcuts import redirect, render
 
 from .forms import ProfileUpdateForm, UserRegisterForm, UserUpdateForm
+from .tasks import delete_profile_image
 
 
 # Create your views here.
@@ -47,27 +46,18 @@ def profile(request):
         u_form = UserUpdateForm(instance=request.user)
         p_form = ProfileUpdateForm(instance=request.user.profile)
 
-    old_image_url = request.user.profile.image.url
+    old_image_name = request.user.profile.image.name
 
     if u_form.is_valid() and p_form.is_valid():
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
         # save user and profile forms
         u_form.save()
         p_form.save()
 
-        try:
-            # if old image url is that of default image, we don't need to remove that file from the machine
-            if old_image_url.split("/")[-1] != "default.jpg":
-
-                # remove old image so that unused profile pics don't clutter space
-                os.remove(BASE_DIR + old_image_url)
-                # print("old image removed successfully!")
-
-        # if image does not exist
-        except OSError as err:
-            # print("old image not removed")
-            print(err)
+        # if old image is the default image, we don't need to remove that file; it is only unused when a new one was uploaded
+        new_image_name = request.user.profile.image.name
+        if old_image_name != "default.jpg" and old_image_name != new_image_name:
+            # remove old image so that unused profile pics don't clutter space, in the background
+            delete_profile_image.delay(old_image_name)
 
         messages.success(
             request, f"Your profile has been updated successfully!"  # noqa: F541